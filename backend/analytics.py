@@ -0,0 +1,162 @@
+import atexit
+import threading
+from collections import deque
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from models import db, QuestionStats
+
+"""
+analytics
+    write-behind quiz analytics. Quiz routes call served() and answered(),
+    which only append an event to an in-process ring buffer. A daemon thread
+    drains the buffer every flush_seconds (sooner once it is half full), sums
+    the events per question and adds them to question_stats in a single
+    transaction. When the buffer is full the oldest events are dropped, so a
+    slow database costs analytics accuracy, never quiz latency. Totals whose
+    write failed because the database was unavailable are kept, one entry
+    per question, and added to the next flush; when the database refuses
+    the batch itself, the rows are written one at a time and those it
+    refuses on their own are discarded and counted in `rejected`.
+"""
+
+ANALYTICS_BUFFER_SIZE = 100000
+ANALYTICS_FLUSH_SECONDS = 2
+# answers needed before a difficulty is suggested from the correct rate
+MIN_ANSWERS_FOR_DIFFICULTY = 20
+
+# PostgreSQL and SQLite >= 3.24; the EXISTS skips questions deleted meanwhile
+ADD_COUNTS = text("""
+    INSERT INTO question_stats (question_id, served, answered, correct)
+    SELECT :question_id, :served, :answered, :correct
+    WHERE EXISTS (SELECT 1 FROM questions WHERE id = :question_id)
+    ON CONFLICT (question_id) DO UPDATE SET
+        served = question_stats.served + excluded.served,
+        answered = question_stats.answered + excluded.answered,
+        correct = question_stats.correct + excluded.correct
+""")
+
+
+class QuizAnalytics:
+
+    def __init__(self, app, buffer_size=ANALYTICS_BUFFER_SIZE, flush_seconds=ANALYTICS_FLUSH_SECONDS):
+        self.app = app
+        self.flush_seconds = flush_seconds
+        self.dropped = 0
+        # questions whose totals the database refused, and were discarded
+        self.rejected = 0
+        # deque appends and pops are atomic, so recording takes no lock
+        self._events = deque(maxlen=buffer_size)
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        # question id -> [served, answered, correct] not yet written
+        self._unwritten = {}
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def served(self, question_id):
+        self._record((question_id, 1, 0, 0))
+
+    def answered(self, question_id, correct):
+        self._record((question_id, 0, 1, 1 if correct else 0))
+
+    def _record(self, event):
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(event)
+        if self._thread is None:
+            self._start()
+        if len(self._events) * 2 >= self._events.maxlen:
+            self._wake.set()
+
+    def _start(self):
+        # started on the first event, so workers and tests that never run a quiz have no thread
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='quiz-analytics', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(e)
+
+    def flush(self):
+        """Writes the buffered events, and totals a failed flush kept, to
+        question_stats; returns how many events were read from the buffer"""
+        with self._flush_lock:
+            totals, self._unwritten = self._unwritten, {}
+            count = 0
+            while True:
+                try:
+                    question_id, served, answered, correct = self._events.popleft()
+                except IndexError:
+                    break
+                counts = totals.setdefault(question_id, [0, 0, 0])
+                counts[0] += served
+                counts[1] += answered
+                counts[2] += correct
+                count += 1
+
+            if not totals:
+                return 0
+
+            rows = [{'question_id': question_id, 'served': served, 'answered': answered, 'correct': correct}
+                    for question_id, (served, answered, correct) in totals.items()]
+            with self.app.app_context():
+                try:
+                    self._write(rows)
+                except OperationalError:
+                    self._unwritten = totals
+                    raise
+                except Exception:
+                    # one bad row fails the whole batch; find it
+                    self._write_each(rows, totals)
+            return count
+
+    def _write(self, rows):
+        try:
+            db.session.execute(ADD_COUNTS, rows)
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            raise
+
+    def _write_each(self, rows, totals):
+        for i, row in enumerate(rows):
+            try:
+                self._write([row])
+            except OperationalError:
+                # the database went away: keep this row and the rest for the next flush
+                self._unwritten = {row['question_id']: totals[row['question_id']] for row in rows[i:]}
+                raise
+            except Exception as e:
+                print(e)
+                self.rejected += 1
+
+
+def suggested_difficulty(answered, correct):
+    """Maps the correct rate to a 1-5 difficulty, or None with too few answers"""
+    if answered < MIN_ANSWERS_FOR_DIFFICULTY:
+        return None
+    rate = correct / answered
+    for difficulty, lowest_rate in enumerate((0.9, 0.7, 0.5, 0.3), start=1):
+        if rate >= lowest_rate:
+            return difficulty
+    return 5
+
+
+def question_stats(question_id):
+    """Returns the flushed counters of a question, zero when it has none"""
+    stats = QuestionStats.query.get(question_id)
+    counts = stats.format() if stats is not None else {
+        'question_id': question_id, 'served': 0, 'answered': 0, 'correct': 0}
+    counts['correct_rate'] = counts['correct'] / counts['answered'] if counts['answered'] else None
+    counts['suggested_difficulty'] = suggested_difficulty(counts['answered'], counts['correct'])
+    return counts
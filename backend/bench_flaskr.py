@@ -0,0 +1,342 @@
+"""Benchmarks every trivia endpoint.
+
+Seeds a database with a configurable number of categories and questions,
+drives each route through the Flask test client (or a local WSGI server with
+--server) and reports throughput and p50/p95/p99 latency. Results can be
+saved as a baseline JSON file and compared against on a later run:
+
+    python bench_flaskr.py --questions 100000 --save baseline.json
+    python bench_flaskr.py --questions 100000 --compare baseline.json
+
+By default the benchmark runs against a SQLite file in a temporary
+directory; pass --database-url to use a local PostgreSQL database.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flaskr import create_app
+from models import db, Question, QuestionBatch, Category, Job
+from bulk import import_questions
+
+
+def seed(app, questions, categories):
+    """Tops the database up to the requested number of rows"""
+    with app.app_context():
+        existing = Category.query.count()
+        for number in range(existing, categories):
+            db.session.add(Category('Category {}'.format(number + 1)))
+        db.session.commit()
+
+        category_ids = [category.id for category in Category.query.all()]
+        missing = questions - Question.query.count()
+        rows = ({
+            'question': 'Benchmark question {} about title {}?'.format(number, random.random()),
+            'answer': 'Answer {}'.format(number),
+            'category': random.choice(category_ids),
+            'difficulty': random.randint(1, 5)
+        } for number in range(max(missing, 0)))
+        import_questions(enumerate(rows, start=1))
+
+        return category_ids, [question_id for question_id, in db.session.query(Question.id)]
+
+
+def insert_questions(app, text, count, category_ids, rng):
+    """Adds `count` throwaway questions for the write routes to delete"""
+    with app.app_context():
+        with QuestionBatch() as batch:
+            batch.insert(Question(text, 'Yes', rng.choice(category_ids), 1) for _ in range(count))
+        return batch.inserted_ids
+
+
+def scenarios(app, category_ids, question_ids, questions):
+    """Returns name -> callable(random) giving (method, path, json body).
+
+    A str body is sent as JSON lines. The callables of the routes that
+    delete questions or quiz sessions create them first, outside the timing.
+    """
+    last_page = max(questions // 10, 1)
+    client = app.test_client()
+
+    def quiz_category(rng):
+        return {'type': 'Category', 'id': rng.choice(category_ids)}
+
+    def created_question(rng):
+        return 'POST', '/questions', {
+            'question': 'Benchmark insert?', 'answer': 'Yes',
+            'category': str(rng.choice(category_ids)), 'difficulty': 1
+        }
+
+    def deleted_question(rng):
+        question_id, = insert_questions(app, 'Benchmark delete?', 1, category_ids, rng)
+        return 'DELETE', '/questions/{}'.format(question_id), None
+
+    def deleted_questions(rng):
+        ids = insert_questions(app, 'Benchmark delete?', 10, category_ids, rng)
+        return 'DELETE', '/questions?ids={}'.format(','.join(str(question_id) for question_id in ids)), None
+
+    def bulk_rows(rng):
+        return 'POST', '/questions/bulk', '\n'.join(json.dumps({
+            'question': 'Benchmark bulk?', 'answer': 'Yes',
+            'category': rng.choice(category_ids), 'difficulty': rng.randint(1, 5)
+        }) for _ in range(10))
+
+    def quiz_session(rng):
+        response = client.post('/quizzes/sessions', json={'quiz_category': quiz_category(rng)})
+        return json.loads(response.data)['session_id']
+
+    jobs = []
+
+    def job(rng):
+        # one job, read over and over; submitting one per request would hit MAX_ACTIVE_JOBS
+        if not jobs:
+            response = client.post('/jobs', json={'type': 'recompute_difficulty'})
+            jobs.append(json.loads(response.data)['job']['id'])
+        return jobs[0]
+
+    return {
+        'GET /categories': lambda rng: ('GET', '/categories', None),
+        'GET /categories/summary': lambda rng: ('GET', '/categories/summary', None),
+        'GET /questions?page': lambda rng: ('GET', '/questions?page={}'.format(rng.randint(1, last_page)), None),
+        'GET /questions?after_id': lambda rng: (
+            'GET', '/questions?after_id={}'.format(rng.choice(question_ids)), None),
+        'GET /categories/<id>/questions': lambda rng: (
+            'GET', '/categories/{}/questions'.format(rng.choice(category_ids)), None),
+        'GET /questions/<id>/stats': lambda rng: (
+            'GET', '/questions/{}/stats'.format(rng.choice(question_ids)), None),
+        'POST /searchquestions': lambda rng: (
+            'POST', '/searchquestions', {'searchTerm': rng.choice(['title', 'question 1', 'answer', 'zzz'])}),
+        'POST /quizzes': lambda rng: ('POST', '/quizzes', {
+            'previous_questions': rng.sample(question_ids, min(len(question_ids), 20)),
+            'quiz_category': quiz_category(rng)
+        }),
+        'POST /quizzes/sessions': lambda rng: (
+            'POST', '/quizzes/sessions', {'quiz_category': quiz_category(rng)}),
+        'POST /quizzes/sessions/<id>/next': lambda rng: (
+            'POST', '/quizzes/sessions/{}/next'.format(quiz_session(rng)), None),
+        'DELETE /quizzes/sessions/<id>': lambda rng: (
+            'DELETE', '/quizzes/sessions/{}'.format(quiz_session(rng)), None),
+        'POST /batch': lambda rng: ('POST', '/batch', {'requests': [
+            {'path': '/categories'},
+            {'path': '/questions?page={}'.format(rng.randint(1, last_page))},
+            {'method': 'POST', 'path': '/quizzes', 'body': {
+                'previous_questions': [], 'quiz_category': quiz_category(rng)}}
+        ]}),
+        'POST /questions': created_question,
+        'PATCH /questions': lambda rng: ('PATCH', '/questions', {
+            'ids': rng.sample(question_ids, min(len(question_ids), 10)), 'difficulty': rng.randint(1, 5)}),
+        'DELETE /questions/<id>': deleted_question,
+        'DELETE /questions': deleted_questions,
+        'POST /questions/bulk': bulk_rows,
+        'GET /questions/export': lambda rng: ('GET', '/questions/export?format={}'.format(
+            rng.choice(['jsonl', 'csv'])), None),
+        'POST /jobs': lambda rng: ('POST', '/jobs', {'type': 'recompute_difficulty'}),
+        'GET /jobs/<id>': lambda rng: ('GET', '/jobs/{}'.format(job(rng)), None),
+    }
+
+
+def cleanups(app):
+    """Returns name -> callable(status, data) run after each timed request of
+    the routes that would otherwise grow the tables or pile up jobs"""
+
+    def delete_questions(text):
+        def cleanup(status, data):
+            if status == 200:
+                with app.app_context():
+                    ids = [question_id for question_id, in
+                           db.session.query(Question.id).filter(Question.question == text)]
+                    with QuestionBatch() as batch:
+                        batch.delete(ids)
+        return cleanup
+
+    def wait_for_job(status, data):
+        # one job at a time, so POST /jobs never hits MAX_ACTIVE_JOBS
+        if status == 202:
+            job_id = json.loads(data)['job']['id']
+            while True:
+                with app.app_context():
+                    if Job.query.get(job_id).status not in ('queued', 'running'):
+                        return
+                time.sleep(0.001)
+
+    return {
+        'POST /questions': delete_questions('Benchmark insert?'),
+        'POST /questions/bulk': delete_questions('Benchmark bulk?'),
+        'POST /jobs': wait_for_job,
+    }
+
+
+class TestClientDriver:
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body):
+        if isinstance(body, str):
+            response = self.client.open(path, method=method, data=body, content_type='application/x-ndjson')
+        else:
+            response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+
+class ServerDriver:
+    """Runs the app on a local werkzeug server; one connection per thread"""
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        self.local = threading.local()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def request(self, method, path, body):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection('127.0.0.1', self.port)
+        if isinstance(body, str):
+            payload, headers = body, {'Content-Type': 'application/x-ndjson'}
+        elif body is not None:
+            payload, headers = json.dumps(body), {'Content-Type': 'application/json'}
+        else:
+            payload, headers = None, {}
+        connection.request(method, path, body=payload, headers=headers)
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def run_scenario(driver, make_request, requests, concurrency, cleanup=None):
+    rng = random.Random(0)
+    calls = [make_request(rng) for _ in range(requests)]
+    latencies = []
+    failures = []
+
+    def timed(call):
+        method, path, body = call
+        started = time.perf_counter()
+        status, data = driver.request(method, path, body)
+        elapsed = time.perf_counter() - started
+        if status >= 400 and status != 404:
+            failures.append(status)
+        if cleanup:
+            cleanup(status, data)
+        return elapsed
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            latencies = list(pool.map(timed, calls))
+    else:
+        latencies = [timed(call) for call in calls]
+    wall = time.perf_counter() - started
+
+    return {
+        'requests': requests,
+        'errors': len(failures),
+        'throughput_rps': round(requests / wall, 1),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Prints the p95 change per route; returns False on any regression"""
+    ok = True
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        change = (result['p95_ms'] - before['p95_ms']) / max(before['p95_ms'], 1e-6)
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            ok = False
+        print('{:<34} p95 {:>9.3f} ms -> {:>9.3f} ms ({:+.0%}){}'.format(
+            name, before['p95_ms'], result['p95_ms'], change, flag))
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=None,
+                        help='SQLAlchemy URI, defaults to a temporary SQLite file')
+    parser.add_argument('--questions', type=int, default=10000)
+    parser.add_argument('--categories', type=int, default=6)
+    parser.add_argument('--requests', type=int, default=500, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--server', action='store_true',
+                        help='serve over HTTP on a local WSGI server instead of the test client')
+    parser.add_argument('--only', action='append', help='run only routes containing this text')
+    parser.add_argument('--save', help='write the results as a baseline JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='p95 slowdown counted as a regression (default 0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    # the benchmark is one client, so it would only measure the rate limiter
+    app = create_app({'DATABASE_URL': database_url, 'DB_CREATE_ALL': True, 'RATE_LIMIT_ENABLED': False})
+    category_ids, question_ids = seed(app, args.questions, args.categories)
+    driver = ServerDriver(app) if args.server else TestClientDriver(app)
+
+    results = {}
+    cleanup_of = cleanups(app)
+    for name, make_request in scenarios(app, category_ids, question_ids, args.questions).items():
+        if args.only and not any(text in name for text in args.only):
+            continue
+        cleanup = cleanup_of.get(name)
+        concurrency = 1 if name in cleanup_of else args.concurrency
+        results[name] = result = run_scenario(driver, make_request, args.requests, concurrency, cleanup)
+        print('{:<34} {:>8.1f} req/s  p50 {:>8.3f} ms  p95 {:>8.3f} ms  p99 {:>8.3f} ms  errors {}'.format(
+            name, result['throughput_rps'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+            result['errors']))
+
+    if args.server:
+        driver.close()
+
+    report = {
+        'database': database_url.split(':', 1)[0],
+        'questions': args.questions,
+        'categories': args.categories,
+        'concurrency': args.concurrency,
+        'server': args.server,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
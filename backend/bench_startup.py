@@ -0,0 +1,71 @@
+"""Measures how long a worker takes to boot.
+
+Each run starts a fresh interpreter, times `import flaskr` and then
+`create_app()`, and the best and median of all runs are reported. Nothing
+touches the database during boot unless DB_CREATE_ALL is set, so the default
+SQLite URI only stands in for the real one:
+
+    python bench_startup.py --runs 20
+    python bench_startup.py --imports 15
+
+--imports also lists the slowest modules imported by flaskr, from
+`python -X importtime`.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BOOT = """
+import json, time
+started = time.perf_counter()
+import flaskr
+imported = time.perf_counter()
+flaskr.create_app({'DATABASE_URL': %r})
+created = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'create_app_ms': (created - imported) * 1000}))
+"""
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def boot(database_url):
+    output = subprocess.check_output([sys.executable, '-c', BOOT % database_url], cwd=HERE)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def slowest_imports(count):
+    """Returns [(cumulative microseconds, module)] for the slowest imports"""
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import flaskr'],
+                             cwd=HERE, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, check=True)
+    modules = []
+    for line in process.stderr.decode().splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        modules.append((int(cumulative), module.rstrip()))
+    return sorted(modules, reverse=True)[:count]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite://')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--imports', type=int, default=0, help='list this many of the slowest imports')
+    args = parser.parse_args(argv)
+
+    runs = [boot(args.database_url) for _ in range(args.runs)]
+    for name in ('import_ms', 'create_app_ms'):
+        samples = [run[name] for run in runs]
+        print('{:<14} best {:>8.1f} ms  median {:>8.1f} ms'.format(
+            name, min(samples), statistics.median(samples)))
+
+    for cumulative, module in slowest_imports(args.imports):
+        print('{:>10.1f} ms  {}'.format(cumulative / 1000, module))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import csv
+import io
+import json
+
+from models import db, DIFFICULTY_LEVELS, Question, category_catalog, question_changed
+
+"""
+bulk
+    streaming import and export of questions.
+
+    Rows are read one at a time from JSONL or CSV, validated, and written in
+    batches of BATCH_SIZE with one transaction per batch: COPY on PostgreSQL,
+    executemany elsewhere. Exports walk the table in id order one batch at a
+    time, so neither direction holds the whole table in memory.
+"""
+
+BATCH_SIZE = 1000
+FIELDS = ('question', 'answer', 'category', 'difficulty')
+
+
+class BulkError(Exception):
+    pass
+
+
+def read_rows(stream, format='jsonl'):
+    """Yields (line number, dict) from a text stream of JSON lines or CSV
+    with a header; the number is the row's line in the file"""
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # the last line of the row, as a quoted field may span several
+            yield reader.line_num, row
+    elif format == 'jsonl':
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+    else:
+        raise BulkError('unknown format {}'.format(format))
+
+
+def validate_row(row):
+    """Returns the insertable values of a row, or raises BulkError"""
+    if not isinstance(row, dict):
+        raise BulkError('row is not an object')
+
+    question = row.get('question')
+    answer = row.get('answer')
+    if not question or not answer:
+        raise BulkError('question and answer are required')
+
+    try:
+        difficulty = int(row.get('difficulty'))
+        category = int(row.get('category'))
+    except (TypeError, ValueError):
+        raise BulkError('category and difficulty must be integers')
+
+    if difficulty not in DIFFICULTY_LEVELS:
+        raise BulkError('difficulty must be one of {}'.format(', '.join(map(str, DIFFICULTY_LEVELS))))
+    if category_catalog.get(category) is None:
+        raise BulkError('unknown category {}'.format(category))
+
+    return {
+        'question': str(question),
+        'answer': str(answer),
+        'category': category,
+        'difficulty': difficulty
+    }
+
+
+def import_questions(rows, batch_size=BATCH_SIZE, max_errors=100):
+    """Validates and inserts (line number, row) pairs, as read_rows yields
+    them, in batched transactions.
+
+    Invalid rows are skipped; returns (inserted count, [(line, message)]).
+    """
+    inserted = 0
+    errors = []
+    batch = []
+
+    try:
+        for line, row in rows:
+            try:
+                batch.append(validate_row(row))
+            except BulkError as e:
+                if len(errors) < max_errors:
+                    errors.append((line, str(e)))
+                continue
+
+            if len(batch) >= batch_size:
+                inserted += _write_batch(batch)
+                batch = []
+
+        if batch:
+            inserted += _write_batch(batch)
+    finally:
+        # batches already committed stay, even when a later one fails
+        if inserted:
+            question_changed('bulk', None)
+    return inserted, errors
+
+
+def _write_batch(batch):
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            _copy_batch(batch)
+        else:
+            db.session.execute(Question.__table__.insert(), batch)
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+    return len(batch)
+
+
+def _copy_batch(batch):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for values in batch:
+        writer.writerow([values[field] for field in FIELDS])
+    buffer.seek(0)
+
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        'COPY questions ({}) FROM STDIN WITH (FORMAT csv)'.format(', '.join(FIELDS)),
+        buffer)
+
+
+def iter_questions(batch_size=BATCH_SIZE):
+    """Yields formatted questions in id order, fetching one batch at a time"""
+    last_id = 0
+    while True:
+        batch = Question.rows(Question.id > last_id) \
+            .order_by(Question.id).limit(batch_size).all()
+        if not batch:
+            return
+        last_id = batch[-1].id
+        yield from Question.format_rows(batch)
+
+
+def export_questions(format='jsonl', batch_size=BATCH_SIZE):
+    """Yields the questions table as JSONL or CSV text chunks"""
+    if format not in ('jsonl', 'csv'):
+        raise BulkError('unknown format {}'.format(format))
+
+    columns = ('id',) + FIELDS
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if format == 'csv':
+        writer.writerow(columns)
+
+    for count, question in enumerate(iter_questions(batch_size), start=1):
+        if format == 'csv':
+            writer.writerow([question[column] for column in columns])
+        else:
+            buffer.write(json.dumps(question))
+            buffer.write('\n')
+
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
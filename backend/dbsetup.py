@@ -4,4 +4,23 @@ load_dotenv()
 DB_HOST = os.getenv('DB_HOST', '127.0.0.1:5432')
 DB_USER = os.getenv('DB_USER', 'postgres')
 DB_PASSWORD = os.getenv('DB_PASSWORD', 'lateefbabatund')
-DB_NAME = os.getenv('DB_NAME', 'trivia_udacity')
\ No newline at end of file
+DB_NAME = os.getenv('DB_NAME', 'trivia_udacity')
+# A full SQLAlchemy URI (e.g. sqlite:// for tests) overrides the DB_* parts
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+# Connection pool, per worker process
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+# PostgreSQL statement_timeout in milliseconds, 0 disables it
+DB_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', '0'))
+
+# Run db.create_all() when the app starts; otherwise use `flask init-db`
+DB_CREATE_ALL = os.getenv('DB_CREATE_ALL', 'false').lower() == 'true'
+
+# Comma separated SQLAlchemy URIs of read replicas for read-only requests
+DB_REPLICA_URLS = [url.strip() for url in os.getenv('DB_REPLICA_URLS', '').split(',') if url.strip()]
+# Clients read from the primary for this long after they write
+DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', '5'))
@@ -0,0 +1,59 @@
+from models import question_index
+
+"""
+decks
+    difficulty-aware quiz draws on top of question_index, whose pools are
+    split per (category, difficulty). A quiz can ask for:
+
+    - difficulty: only questions of that level
+    - difficulty_curve: the level of each step, e.g. [1, 1, 2, 3, 5]; the
+      last level repeats once the curve runs out
+    - stratified: cycle through every level that has questions, so a game
+      is balanced across difficulties
+
+    Curves and stratified games fall back to the nearest level that still
+    has unseen questions. Every draw is a constant-time pick from a pool.
+"""
+
+
+def step_difficulty(step, levels, curve=None, stratified=False):
+    """Returns the difficulty wanted at quiz step `step` (0-based), or None"""
+    if curve:
+        return curve[min(step, len(curve) - 1)]
+    if stratified and levels:
+        return levels[step % len(levels)]
+    return None
+
+
+def draw(category=None, exclude=(), step=0, difficulty=None, curve=None, stratified=False):
+    """Returns the id of an unseen question for quiz step `step`, or None"""
+    if difficulty is not None:
+        return question_index.pick(category, exclude, difficulty)
+
+    levels = question_index.difficulties(category)
+    target = step_difficulty(step, levels, curve, stratified)
+    if target is None:
+        return question_index.pick(category, exclude)
+
+    for level in sorted(levels, key=lambda level: (abs(level - target), level)):
+        question_id = question_index.pick(category, exclude, level)
+        if question_id is not None:
+            return question_id
+    return None
+
+
+def build_deck(category=None, length=None, difficulty=None, curve=None, stratified=False):
+    """Returns up to `length` distinct question ids in the order they should
+    be asked"""
+    if curve is None and not stratified:
+        return question_index.sample(category, length, difficulty)
+
+    deck = []
+    seen = set()
+    while length is None or len(deck) < length:
+        question_id = draw(category, seen, len(deck), difficulty, curve, stratified)
+        if question_id is None:
+            break
+        deck.append(question_id)
+        seen.add(question_id)
+    return deck
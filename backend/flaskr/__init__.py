@@ -1,41 +1,243 @@
-from ast import If
-from calendar import c
-from crypt import methods
-from gettext import Catalog
-from hashlib import new
-from http.client import NETWORK_AUTHENTICATION_REQUIRED
-import json
-from multiprocessing.connection import answer_challenge
-from tkinter import N
-from unicodedata import category
-
-from models import Category
 import os
-from flask import Flask, request, abort, jsonify
-from flask_sqlalchemy import SQLAlchemy
+import codecs
+import time
+import click
+from flask import Flask, request, abort, jsonify, Response, stream_with_context, g, current_app, send_file
 from flask_cors import CORS
-import random
 
-from models import setup_db, Question, Category, db
+from dbsetup import DB_REPLICA_URLS, DB_REPLICA_STICKY_SECONDS
+from models import setup_db, DB_PATH, DB_CREATE_ALL, DIFFICULTY_LEVELS, MAX_ID, Question, QuestionBatch, CategoryCount, Job, db, question_counts, question_index, category_catalog
+from search import question_search, create_search_index
+from decks import draw, build_deck
+from analytics import QuizAnalytics, question_stats
+from bulk import BulkError, read_rows, validate_row, import_questions, export_questions
+from jobs import JOB_WORKERS, MAX_ACTIVE_JOBS, JobError, JobRunner, JobsBusy, export_path
+from snapshot import QuestionSnapshot
+from .batch import init_batch
+from .cache import ResponseCache, cached_response
+from .compression import init_compression
+from .ratelimit import RATE_LIMITS, init_rate_limits, make_bucket_store, refused
+from .quiz_sessions import SessionNotFound, QUIZ_SESSION_QUESTIONS, make_store, new_session_id
 
 QUESTIONS_PER_PAGE = 10
 
+# POST routes that only read, so they can be served by a read replica;
+# /batch sub-requests are routed (and stick to the primary) one by one
+READ_ONLY_ENDPOINTS = {'search_or_question', 'play_quiz', 'next_quiz_question', 'batch'}
+# cookie that keeps a client on the primary right after it wrote
+PRIMARY_COOKIE = 'trivia_primary_until'
 
-def paginate_response(request, options):
+# most ids one PATCH/DELETE /questions or list POST /questions may touch
+MAX_BATCH_SIZE = 1000
+
+# gzip/brotli for large responses, see flaskr/compression.py
+COMPRESS_RESPONSES = os.getenv('COMPRESS_RESPONSES', 'true').lower() == 'true'
+
+# Server-Timing headers and the /metrics endpoint, see flaskr/metrics.py
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+
+# "memory" or a redis:// URL, see flaskr/quiz_sessions.py
+QUIZ_SESSION_STORE = os.getenv('QUIZ_SESSION_STORE', 'memory')
+
+# file every worker memory-maps the questions from, see snapshot.py; empty to read PostgreSQL
+QUESTION_SNAPSHOT_PATH = os.getenv('QUESTION_SNAPSHOT_PATH', '')
+
+# token buckets and in-flight caps for the expensive routes, see flaskr/ratelimit.py
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+# "memory" or a redis:// URL shared by all workers
+RATE_LIMIT_STORE = os.getenv('RATE_LIMIT_STORE', 'memory')
+
+# background job threads per worker, and queued or running jobs allowed at once, see jobs.py
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', JOB_WORKERS))
+MAX_ACTIVE_JOBS = int(os.getenv('MAX_ACTIVE_JOBS', MAX_ACTIVE_JOBS))
+
+
+def requested_fields(request):
+    """Returns the question fields named by `?fields=a,b`, in Question.FIELDS
+    order. The id is always included; unknown names are ignored."""
+    names = request.args.get("fields", None)
+    if not names:
+        return Question.FIELDS
+    names = set(name.strip() for name in names.split(','))
+    return tuple(field for field in Question.FIELDS if field == 'id' or field in names)
+
+
+def slim_questions(request, questions):
+    """Drops the fields the client did not ask for from formatted questions"""
+    fields = requested_fields(request)
+    if fields == Question.FIELDS:
+        return questions
+    return [{field: question[field] for field in fields} for question in questions]
+
+
+def categories_payload():
+    """Returns the "categories" and "categories_version" keys of a response.
+
+    A client that sends the `?categories_version=` it already holds gets only
+    the version back, so the catalog is not repeated on every page.
+    """
+    version = category_catalog.version()
+    if request.args.get("categories_version") == version:
+        return {"categories_version": version}
+    return {"categories": category_catalog.all(), "categories_version": version}
+
+
+def corpus_snapshot():
+    """The shared question snapshot when it is enabled and current, else None"""
+    snapshot = current_app.extensions.get('question_snapshot')
+    return snapshot.current() if snapshot is not None else None
+
+
+def formatted_question(question_id):
+    """Question.get_formatted(), read from the snapshot when possible"""
+    snapshot = corpus_snapshot()
+    question = snapshot.get(question_id) if snapshot is not None else None
+    return question or Question.get_formatted(question_id)
+
+
+def paginate_response(request, selection, category_id=None):
+    """Fetches and formats only the page of `selection` asked for by the client.
+
+    `selection` is an unevaluated Question.rows() query ordered by id, so the page is
+    cut with LIMIT/OFFSET in the database instead of slicing the whole table.
+    Passing `?after_id=<id>` switches to keyset paging, which returns the
+    questions that come right after that id and stays fast on deep pages.
+    With `?fields=` only the named columns are selected.
+
+    When the question snapshot is current the page is read from it instead;
+    `category_id` must then name the category `selection` is limited to.
+    """
+    after_id = request.args.get("after_id", None, type=int)
     page = request.args.get("page", 1, type=int)
-    start = (page - 1) * QUESTIONS_PER_PAGE
-    end = start + QUESTIONS_PER_PAGE
+    if after_id is None and page < 1:
+        return []
+    offset = (page - 1) * QUESTIONS_PER_PAGE
+    fields = requested_fields(request)
+
+    snapshot = corpus_snapshot()
+    if snapshot is not None:
+        return snapshot.page(category_id, offset, after_id, QUESTIONS_PER_PAGE, fields)
+
+    if after_id is not None:
+        page_query = selection.filter(Question.id > after_id)
+    else:
+        page_query = selection.offset(offset)
+
+    if fields != Question.FIELDS:
+        page_query = page_query.with_entities(*[getattr(Question, field) for field in fields])
+    return Question.format_rows(page_query.limit(QUESTIONS_PER_PAGE).all(), fields)
 
-    questions = [question.format() for question in options]
-    currently_displayed_questions = questions[start:end] 
-    
-    return currently_displayed_questions
+
+def resolve_quiz_category(quiz_category):
+    """Returns (category id or None for all categories, category dict).
+
+    The frontend sends "ALL" as the click event, with an id of 0. Aborts
+    with 400 unless `quiz_category` is an object with an integer id.
+    """
+    if not isinstance(quiz_category, dict):
+        abort(400)
+    try:
+        category_id = int(quiz_category.get('id') or 0)
+    except (TypeError, ValueError):
+        abort(400)
+    if not 0 <= category_id <= MAX_ID:
+        abort(400)
+    if quiz_category.get('type') == 'click' or category_id == 0:
+        return None, category_catalog.get(1)
+    return category_id, category_catalog.get(category_id)
+
+
+def deck_options(body):
+    """Reads the optional difficulty, difficulty_curve and stratified
+    settings of a quiz request; aborts with 400 when they are malformed or
+    name a level outside DIFFICULTY_LEVELS."""
+    options = {'stratified': bool(body.get('stratified', False))}
+    try:
+        if body.get('difficulty') is not None:
+            options['difficulty'] = int(body['difficulty'])
+        if body.get('difficulty_curve'):
+            options['curve'] = [int(level) for level in body['difficulty_curve']]
+    except (TypeError, ValueError):
+        abort(400)
+    levels = options.get('curve', []) + ([options['difficulty']] if 'difficulty' in options else [])
+    if any(level not in DIFFICULTY_LEVELS for level in levels):
+        abort(400)
+    return options
+
+
+def record_answer(analytics, body):
+    """Counts the answer a quiz step may report for the question before it,
+    sent as {"answer": {"question_id": <id>, "correct": <bool>}}."""
+    answer = (body or {}).get('answer')
+    if not answer:
+        return
+    try:
+        question_id = int(answer['question_id'])
+    except (TypeError, KeyError, ValueError):
+        abort(400)
+    if not 0 < question_id <= MAX_ID:
+        abort(400)
+    analytics.answered(question_id, bool(answer.get('correct')))
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+    # key order is already stable, sorting every response only costs CPU
+    app.config['JSON_SORT_KEYS'] = False
+    if test_config:
+        app.config.update(test_config)
+    setup_db(app,
+             app.config.get('DATABASE_URL', DB_PATH),
+             create_all=app.config.get('DB_CREATE_ALL', DB_CREATE_ALL),
+             replica_paths=app.config.get('DB_REPLICA_URLS', DB_REPLICA_URLS))
+    app.extensions['response_cache'] = ResponseCache()
+
+    # registered first so it runs after every other after_request hook
+    if app.config.get('COMPRESS_RESPONSES', COMPRESS_RESPONSES):
+        init_compression(app)
+
+    if app.config.get('METRICS_ENABLED', METRICS_ENABLED):
+        # imported on demand: it hooks every engine, and most workers run without it
+        from .metrics import init_metrics
+        init_metrics(app)
+
+    snapshot_path = app.config.get('QUESTION_SNAPSHOT_PATH', QUESTION_SNAPSHOT_PATH)
+    if snapshot_path:
+        app.extensions['question_snapshot'] = QuestionSnapshot(app, snapshot_path)
+
+    if app.config.get('RATE_LIMIT_ENABLED', RATE_LIMIT_ENABLED):
+        app.extensions['rate_limits'] = init_rate_limits(
+            app,
+            app.config.get('RATE_LIMITS', RATE_LIMITS),
+            make_bucket_store(app.config.get('RATE_LIMIT_STORE', RATE_LIMIT_STORE)))
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Creates the tables and search index."""
+        db.create_all()
+        create_search_index(db.engine)
+        click.echo('database initialised')
+
+    """
+    Read replicas: reads go to a replica unless this client wrote within
+    the last DB_REPLICA_STICKY_SECONDS, so it always sees its own writes.
+    """
+    sticky_seconds = app.config.get('DB_REPLICA_STICKY_SECONDS', DB_REPLICA_STICKY_SECONDS)
+
+    @app.before_request
+    def route_reads():
+        read_only = request.method in ('GET', 'HEAD') or request.endpoint in READ_ONLY_ENDPOINTS
+        primary_until = request.cookies.get(PRIMARY_COOKIE, 0, type=float)
+        g.db_read_only = read_only and primary_until < time.time()
+
+    @app.after_request
+    def stick_writers_to_primary(response):
+        read_only = request.method in ('GET', 'HEAD', 'OPTIONS') or request.endpoint in READ_ONLY_ENDPOINTS
+        if not read_only and response.status_code < 400 and 'db_replicas' in app.extensions:
+            response.set_cookie(PRIMARY_COOKIE, str(time.time() + sticky_seconds),
+                                max_age=sticky_seconds, httponly=True)
+        return response
 
     """
     @done: Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
@@ -58,19 +260,48 @@ def create_app(test_config=None):
     for all available categories.
     """
     @app.route('/categories', methods=["GET"])
+    @cached_response
     def get_categories():
-        categories = Category.query.order_by(Category.id).all()
+        categories = category_catalog.all()
 
         if not categories:
             abort(404)
 
-        categoryList = [category.format() for category in categories]
-
         return jsonify({
             "success": True,
-            "categories": categoryList
+            "categories": categories,
+            "categories_version": category_catalog.version()
         }), 200
 
+    """
+    Question counts per category and difficulty, read from the
+    category_counts table that triggers keep current.
+    """
+    @app.route('/categories/summary', methods=["GET"])
+    @cached_response
+    def get_categories_summary():
+        counts = CategoryCount.by_category()
+        categories = list(category_catalog.all())
+        # questions without a (known) category are listed with a null type
+        known = set(category['id'] for category in categories)
+        categories += [{'id': category_id, 'type': None} for category_id in counts if category_id not in known]
+
+        summary = []
+        for category in categories:
+            difficulties = counts.get(category['id'], {})
+            summary.append({
+                "id": category['id'],
+                "type": category['type'],
+                "total_questions": sum(difficulties.values()),
+                "difficulties": difficulties
+            })
+
+        return jsonify({
+            "success": True,
+            "categories": summary,
+            "total_questions": sum(category['total_questions'] for category in summary)
+        })
+
     """
     TEST: At this point, when you start the application
     you should see questions and categories generated,
@@ -79,24 +310,20 @@ def create_app(test_config=None):
     """
 
     @app.route('/questions', methods=["GET"])
+    @cached_response
     def get_questions():
         try:
-            questions = Question.query.order_by(Question.id).all()
-            categories = Category.query.order_by(Category.id).all()
-
-            # questions_db = paginate_response(request, Question)
-            currently_displayed_questions = paginate_response(request, questions)
+            currently_displayed_questions = paginate_response(request, Question.rows().order_by(Question.id))
 
             if len(currently_displayed_questions) == 0:
                 abort(404)
 
-            return jsonify({
+            return jsonify(dict({
                 "success": True,
                 "questions": currently_displayed_questions,
-                "total_questions": len(Question.query.all()),
-                "categories": [category.format() for category in categories],
+                "total_questions": question_counts.total(),
                 "current_category": "History"
-            }), 200
+            }, **categories_payload())), 200
         except BaseException as e:
             db.session.rollback()
             print(e) 
@@ -118,18 +345,15 @@ def create_app(test_config=None):
                 abort(404)
             else:
                 question.delete()
-                options = Question.query.order_by(Question.id).all()
-                categories = Category.query.order_by(Category.id).all()
-                currently_displayed_questions = paginate_response(request, options)
+                currently_displayed_questions = paginate_response(request, Question.rows().order_by(Question.id))
 
-                return jsonify({
+                return jsonify(dict({
                     "success": True,
                     "questions": currently_displayed_questions,
                     "deleted_question": question_id,
-                    "total_questions": len(Question.query.all()),
-                    "categories": [categories.format() for category in categories],
+                    "total_questions": question_counts.total(),
                     "current_category": "History"
-                })
+                }, **categories_payload()))
         except BaseException as e:
             db.session.rollback()
             print(e) 
@@ -145,30 +369,37 @@ def create_app(test_config=None):
     """
     @app.route('/questions', methods=["POST"])
     def create_question():
-        try:
-            request = request.get_json()
+        body = request.get_json()
+        if isinstance(body, list):
+            return create_questions(body)
+        if not isinstance(body, dict):
+            abort(400)
 
-            question = request.get('question')
-            answer = request.get('answer')
-            difficulty = request.get('difficulty')
-            category = request.get('category')
+        question = body.get('question')
+        answer = body.get('answer')
+        difficulty = body.get('difficulty')
+        category = body.get('category')
 
-            if not question or not answer or not category or not difficulty:
-                abort(400)
-            options = Question.query.order_by(Question.id).all()
-            categories = Category.query.order_by(Category.id).all()
+        if not question or not answer or not category or not difficulty:
+            abort(400)
+        try:
+            difficulty = int(difficulty)
+        except (TypeError, ValueError):
+            abort(400)
+        if difficulty not in DIFFICULTY_LEVELS:
+            abort(400)
 
+        try:
             new_question = Question(question = question, answer = answer, difficulty = difficulty, category = category)
             new_question.insert()
-            currently_displaced_questions = paginate_response(request, options)
+            currently_displaced_questions = paginate_response(request, Question.rows().order_by(Question.id))
 
             # this is wia I am next tin to do is to return jsonify
-            return jsonify({
+            return jsonify(dict({
                 "questions": currently_displaced_questions,
-                "total_questions": len(Question.query.all()),
-                "categories":  [category.format() for category in categories],
+                "total_questions": question_counts.total(),
                 "currentCategory": 'History'
-            })
+            }, **categories_payload()))
         except BaseException as e:
             db.session.rollback()
             print(e)
@@ -176,6 +407,96 @@ def create_app(test_config=None):
         finally:
             db.session.close()
 
+    """
+    Batched writes. Each request runs in one transaction and answers with
+    only the affected ids instead of re-reading the questions.
+    """
+    def batch_ids(ids):
+        """Returns `ids` as ints; aborts with 400 unless it is a non-empty
+        list of at most MAX_BATCH_SIZE integers"""
+        if not isinstance(ids, list) or not ids or len(ids) > MAX_BATCH_SIZE:
+            abort(400)
+        if not all(isinstance(question_id, int) and not isinstance(question_id, bool) for question_id in ids):
+            abort(400)
+        return ids
+
+    def create_questions(rows):
+        if not rows or len(rows) > MAX_BATCH_SIZE:
+            abort(400)
+        if not all(isinstance(row, dict) for row in rows):
+            abort(400)
+        try:
+            values = [validate_row(row) for row in rows]
+        except BulkError:
+            abort(400)
+
+        try:
+            with QuestionBatch() as batch:
+                batch.insert(Question(**row) for row in values)
+            return jsonify({
+                "success": True,
+                "created": batch.inserted_ids
+            })
+        except BaseException as e:
+            print(e)
+            abort(422)
+        finally:
+            db.session.close()
+
+    @app.route('/questions', methods=["PATCH"])
+    def update_questions():
+        body = request.get_json()
+        if not isinstance(body, dict):
+            abort(400)
+
+        ids = batch_ids(body.get('ids'))
+        values = {field: body[field] for field in ('difficulty', 'category') if body.get(field) is not None}
+        if not values:
+            abort(400)
+        try:
+            values = {field: int(value) for field, value in values.items()}
+        except (TypeError, ValueError):
+            abort(400)
+        if 'difficulty' in values and values['difficulty'] not in DIFFICULTY_LEVELS:
+            abort(400)
+        if 'category' in values and category_catalog.get(values['category']) is None:
+            abort(400)
+
+        try:
+            with QuestionBatch() as batch:
+                batch.update(ids, **values)
+            return jsonify({
+                "success": True,
+                "updated": batch.updated_ids
+            })
+        except BaseException as e:
+            print(e)
+            abort(422)
+        finally:
+            db.session.close()
+
+    @app.route('/questions', methods=["DELETE"])
+    def delete_questions():
+        try:
+            ids = [int(question_id) for value in request.args.getlist('ids')
+                   for question_id in value.split(',') if question_id]
+        except ValueError:
+            abort(400)
+        ids = batch_ids(ids)
+
+        try:
+            with QuestionBatch() as batch:
+                batch.delete(ids)
+            return jsonify({
+                "success": True,
+                "deleted": batch.deleted_ids
+            })
+        except BaseException as e:
+            print(e)
+            abort(422)
+        finally:
+            db.session.close()
+
     """
 
     TEST: Search by any phrase. The questions list will update to include
@@ -184,19 +505,32 @@ def create_app(test_config=None):
     """
     @app.route('/searchquestions', methods=["POST"])
     def search_or_question():
+        body = request.get_json()
+        if not isinstance(body, dict):
+            abort(400)
+
+        searchKeyword = body.get('searchTerm', '')
+        if not isinstance(searchKeyword, str):
+            abort(400)
+        page = request.args.get("page", 1, type=int)
+        if page < 1:
+            abort(404)
+
         try:
-            request = request.get_json()
-            searchKeyword = request.get('searchTerm', None)
-            options = Question.query.filter(Question.question.ilike(f'%{searchKeyword}%')).all()
-            currently_displaced_questions = paginate_response(request, options)
+            questions, total = question_search.search(
+                searchKeyword, (page - 1) * QUESTIONS_PER_PAGE, QUESTIONS_PER_PAGE)
             return jsonify({
-                "questions": currently_displaced_questions,
-                "total_questions": len(currently_displaced_questions),
+                "questions": slim_questions(request, questions),
+                "total_questions": total,
                 "current_category": "History"
             })
         
         except BaseException as e:
+            db.session.rollback()
             print(e)
+            abort(422)
+        finally:
+            db.session.close()
         
     
     """
@@ -205,17 +539,18 @@ def create_app(test_config=None):
     category to be shown.
     """
     @app.route('/categories/<int:category_id>/questions', methods=["GET"])
+    @cached_response
     def get_category_questions(category_id):
-        category = Category.query.filter(id = category_id).one_or_none()
+        category = category_catalog.get(category_id)
         if not category:
-            abort(422)
+            abort(404)
         
-        options = Question.query.filter(Question.category == category_id).order_by(Question.id).all()
-        currently_displaced_questions = paginate_response(request, options)
+        options = Question.rows(Question.category == category_id).order_by(Question.id)
+        currently_displaced_questions = paginate_response(request, options, category_id)
         return jsonify({
             "questions": currently_displaced_questions,
-            "total_questions": len(Question.query.all()),
-            "currentCategory": category.type
+            "total_questions": question_counts.total(category_id),
+            "currentCategory": category['type']
         })
 
 
@@ -224,69 +559,266 @@ def create_app(test_config=None):
     one question at a time is displayed, the user is allowed to answer
     and shown whether they were correct or not.
     """
+    analytics = app.extensions['quiz_analytics'] = QuizAnalytics(app)
+
     @app.route('/quizzes', methods=["POST"])
     def play_quiz():
-        request = request.get_json()
+        body = request.get_json()
 
-        previous_questions = request.get('previous_questions', None)
-        quiz_category = request.get('quiz_category', None)
-
-        if "previous_questions" in request:
-            pass
-        else:
+        if not isinstance(body, dict) or "previous_questions" not in body or "quiz_category" not in body:
             abort(400)
+        record_answer(analytics, body)
 
-        if "quiz_category" in request:
-            pass
-        else:
+        previous_questions = body.get('previous_questions') or []
+        quiz_category = body.get('quiz_category') or {}
+        if not isinstance(previous_questions, list) or not all(
+                isinstance(question_id, int) and not isinstance(question_id, bool)
+                for question_id in previous_questions):
             abort(400)
 
+        category_id, category = resolve_quiz_category(quiz_category)
+        if category is None:
+            abort(404)
+        options = deck_options(body)
 
-        if quiz_category['type'] == 'click':
-            questions = Question.query.order_by('id').all()
-            category = Category.query.filter_by(id = '1').first()
-        else:
-            questions = Question.query.filter(Question.category == quiz_category['type']).all()
-            category = Category.query.filter_by(id = quiz_category['type']).first()
+        try:
+            # Draw ids from the in-memory index, skipping ones another worker deleted
+            seen = set(previous_questions)
+            step = len(previous_questions)
+            selection = None
+            while selection is None:
+                question_id = draw(category_id, seen, step, **options)
+                if question_id is None:
+                    break
+                selection = formatted_question(question_id)
+                if selection is None:
+                    question_index.discard(question_id)
+                    seen.add(question_id)
+
+            if selection is not None:
+                analytics.served(selection['id'])
+            return jsonify(
+                {
+                "success": True,
+                "question": selection,
+                "currentCategory": category['type']
+            }
+            )
 
-        if questions == []:
+        except Exception as e:
+            print(e)
+            abort(422)
+
+    """
+    Quiz sessions keep the shuffled questions of a game on the server, so
+    each step sends only the session id instead of every previous question.
+    """
+    quiz_sessions = app.extensions['quiz_sessions'] = make_store(
+        app.config.get('QUIZ_SESSION_STORE', QUIZ_SESSION_STORE))
+
+    @app.route('/quizzes/sessions', methods=["POST"])
+    def create_quiz_session():
+        body = request.get_json()
+        if not isinstance(body, dict) or "quiz_category" not in body:
+            abort(400)
+
+        category_id, category = resolve_quiz_category(body.get('quiz_category') or {})
+        if category is None:
             abort(404)
+        options = deck_options(body)
 
         try:
+            session_id = new_session_id()
+            question_ids = build_deck(category_id, QUIZ_SESSION_QUESTIONS, **options)
+            quiz_sessions.create(session_id, category_id, question_ids)
+            return jsonify({
+                "success": True,
+                "session_id": session_id,
+                "total_questions": len(question_ids),
+                "currentCategory": category['type']
+            })
+        except Exception as e:
+            print(e)
+            abort(422)
 
-            filter_questions = []
+    @app.route('/quizzes/sessions/<session_id>/next', methods=["POST"])
+    def next_quiz_question(session_id):
+        record_answer(analytics, request.get_json(silent=True))
+        try:
+            selection = None
+            while selection is None:
+                category_id, question_id = quiz_sessions.next_id(session_id)
+                if question_id is None:
+                    break
+                # skip questions deleted since the session started
+                selection = formatted_question(question_id)
+        except SessionNotFound:
+            abort(404)
+        if selection is not None:
+            analytics.served(selection['id'])
 
-            # If the previous_question list is empty, no need to filter the questions from the previous questions
-            if len(previous_questions) == 0:
-                filter_questions = questions
+        category = category_catalog.get(category_id if category_id is not None else 1)
+        return jsonify({
+            "success": True,
+            "question": selection,
+            "currentCategory": category['type'] if category else None
+        })
 
-            # If the prevoius_question list is not empty loop through the questions data to remove each of them
-            for p in previous_questions:
-                filter_questions = filter(lambda a: a.id != p, questions)
-                questions = list(filter_questions)
-                
+    @app.route('/quizzes/sessions/<session_id>', methods=["DELETE"])
+    def delete_quiz_session(session_id):
+        quiz_sessions.delete(session_id)
+        return jsonify({
+            "success": True,
+            "deleted": session_id
+        })
 
-            # # Format tha rest of the question data so it can be sent using jsonify
-            selection = [question.format() for question in questions]
+    """
+    Quiz statistics of one question, as of the last analytics flush (a few
+    seconds behind the quizzes being played).
+    """
+    @app.route('/questions/<int:question_id>/stats', methods=["GET"])
+    def get_question_stats(question_id):
+        question = Question.get_formatted(question_id)
+        if question is None:
+            abort(404)
 
-            # If the question data is not empty, randomly select one question from the list
-            if len(selection) != 0: 
-                random_selection = random.randrange(len(selection))
-                selection = selection[random_selection]
-            else:
-                selection = []
+        return jsonify(dict({
+            "success": True,
+            "difficulty": question['difficulty']
+        }, **question_stats(question_id)))
 
-            return jsonify(
-                {
-                "success": True,
-                "question": selection,
-                "currentCategory": category.type
-            }
-            )
+    """
+    Several requests in one round trip, see flaskr/batch.py.
+    """
+    init_batch(app)
 
-        except Exception as e:
+    """
+    Bulk import and export. Rows are streamed as JSON lines, or as CSV with a
+    header when the content type or ?format= says csv, and inserted in
+    batched transactions. Invalid rows are skipped and reported by line.
+    """
+    @app.route('/questions/bulk', methods=["POST"])
+    def bulk_create_questions():
+        format = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'jsonl')
+        if format not in ('jsonl', 'csv'):
+            abort(400)
+
+        try:
+            lines = codecs.iterdecode(request.stream, 'utf-8')
+            inserted, errors = import_questions(read_rows(lines, format))
+            return jsonify({
+                "success": True,
+                "inserted": inserted,
+                "errors": [{"line": line, "message": message} for line, message in errors],
+                "total_questions": question_counts.total()
+            })
+        except BaseException as e:
+            db.session.rollback()
             print(e)
             abort(422)
+        finally:
+            db.session.close()
+
+    @app.route('/questions/export', methods=["GET"])
+    def export_all_questions():
+        format = request.args.get('format', 'jsonl')
+        if format not in ('jsonl', 'csv'):
+            abort(400)
+
+        mimetype = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+        return Response(stream_with_context(export_questions(format)), mimetype=mimetype)
+
+    @app.cli.command('import-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', type=click.Choice(['jsonl', 'csv']), default=None)
+    def import_questions_command(path, format):
+        """Loads questions from a JSONL or CSV file."""
+        format = format or ('csv' if path.endswith('.csv') else 'jsonl')
+        with open(path, encoding='utf-8', newline='') as stream:
+            inserted, errors = import_questions(read_rows(stream, format))
+        for line, message in errors:
+            click.echo('line {}: {}'.format(line, message), err=True)
+        click.echo('inserted {} questions'.format(inserted))
+
+    @app.cli.command('export-questions')
+    @click.argument('path', type=click.Path(dir_okay=False))
+    @click.option('--format', type=click.Choice(['jsonl', 'csv']), default=None)
+    def export_questions_command(path, format):
+        """Writes every question to a JSONL or CSV file."""
+        format = format or ('csv' if path.endswith('.csv') else 'jsonl')
+        with open(path, 'w', encoding='utf-8', newline='') as stream:
+            for chunk in export_questions(format):
+                stream.write(chunk)
+
+    """
+    Background maintenance jobs, see jobs.py. POST /jobs queues one and
+    answers 202 at once; GET /jobs/<id> reports its status, progress and
+    result, and DELETE /jobs/<id> cancels it.
+    """
+    jobs = app.extensions['jobs'] = JobRunner(
+        app,
+        app.config.get('JOB_WORKERS', JOB_WORKERS),
+        app.config.get('MAX_ACTIVE_JOBS', MAX_ACTIVE_JOBS))
+
+    @app.route('/jobs', methods=["POST"])
+    def submit_job():
+        body = request.get_json()
+        if not isinstance(body, dict) or not isinstance(body.get('type'), str):
+            abort(400)
+
+        try:
+            job = jobs.submit(body['type'], body.get('params'))
+        except JobError as e:
+            return jsonify({"success": False, "error": 400, "message": str(e)}), 400
+        except JobsBusy:
+            return refused(503, "too many jobs running", 30)
+
+        response = jsonify({
+            "success": True,
+            "job": job.format()
+        })
+        response.status_code = 202
+        response.headers['Location'] = '/jobs/{}'.format(job.id)
+        return response
+
+    @app.route('/jobs/<int:job_id>', methods=["GET"])
+    def get_job(job_id):
+        job = Job.query.get(job_id)
+        if job is None:
+            abort(404)
+
+        return jsonify({
+            "success": True,
+            "job": job.format()
+        })
+
+    @app.route('/jobs/<int:job_id>', methods=["DELETE"])
+    def cancel_job(job_id):
+        try:
+            job = jobs.cancel(job_id)
+        except JobError:
+            abort(422)
+        if job is None:
+            abort(404)
+
+        return jsonify({
+            "success": True,
+            "job": job.format()
+        })
+
+    @app.route('/jobs/<int:job_id>/download', methods=["GET"])
+    def download_job_result(job_id):
+        job = Job.query.get(job_id)
+        if job is None or job.type != 'export_questions' or job.status != 'succeeded':
+            abort(404)
+
+        format = job.format()['params'].get('format', 'jsonl')
+        path = export_path(job.id, format)
+        if not os.path.exists(path):
+            abort(404)
+        mimetype = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+        return send_file(path, mimetype=mimetype, as_attachment=True,
+                         attachment_filename=os.path.basename(path))
 
     """
     @TODO:
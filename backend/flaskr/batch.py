@@ -0,0 +1,118 @@
+import json
+
+from flask import g, request, jsonify, abort
+from werkzeug.test import EnvironBuilder
+
+from models import db
+from replicas import shared_connections
+
+"""
+Batch requests
+    POST /batch runs a list of sub-requests against the other routes of the
+    app and answers with all their results at once, so a view that needs
+    categories, a page of questions and a quiz step pays for one round trip.
+
+    Sub-requests run in order inside the app context of the batch request,
+    sharing its thread's database session, with the usual before/after
+    request hooks (rate limits included). Each one starts with an empty `g`,
+    and the outer request's `g` is restored afterwards. Cookies set by a
+    sub-request are sent with the sub-requests after it, so a read that
+    follows a write in the same batch sticks to the primary, and are passed
+    on in the batch response.
+
+    The session keeps one connection per database (primary or replica) for
+    the whole batch, so the commits and closes of the handlers do not check
+    a connection in and out of the pool for every sub-request.
+"""
+
+MAX_BATCH_REQUESTS = 20
+BATCH_METHODS = {'GET', 'POST', 'PATCH', 'DELETE'}
+
+
+def _validate(sub_requests):
+    if not isinstance(sub_requests, list) or not 0 < len(sub_requests) <= MAX_BATCH_REQUESTS:
+        abort(400)
+    for sub_request in sub_requests:
+        if not isinstance(sub_request, dict):
+            abort(400)
+        path = sub_request.get('path')
+        method = str(sub_request.get('method', 'GET')).upper()
+        if not isinstance(path, str) or not path.startswith('/') or method not in BATCH_METHODS:
+            abort(400)
+        if path.partition('?')[0].rstrip('/') == '/batch':
+            abort(400)
+
+
+def _environ(sub_request, cookies):
+    path, _, query_string = sub_request['path'].partition('?')
+    body = sub_request.get('body')
+    headers = {}
+    # cookies set earlier in the batch come first, so they win over the client's
+    cookie = '; '.join(list(cookies.values()) + [request.headers.get('Cookie', '')]).strip('; ')
+    if cookie:
+        headers['Cookie'] = cookie
+    builder = EnvironBuilder(
+        path=path,
+        base_url=request.host_url,
+        query_string=query_string,
+        method=str(sub_request.get('method', 'GET')).upper(),
+        headers=headers,
+        data=json.dumps(body) if body is not None else None,
+        content_type='application/json' if body is not None else None,
+        environ_base={'REMOTE_ADDR': request.remote_addr})
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+
+def _dispatch(app, sub_request, cookies):
+    saved = dict(g.__dict__)
+    g.__dict__.clear()
+    try:
+        with app.request_context(_environ(sub_request, cookies)):
+            try:
+                return app.full_dispatch_request()
+            except Exception as e:
+                print(e)
+                db.session.rollback()
+                response = jsonify({"success": False, "error": 500, "message": "Internal server error"})
+                response.status_code = 500
+                return response
+    finally:
+        g.__dict__.clear()
+        g.__dict__.update(saved)
+
+
+def init_batch(app):
+    """Adds the POST /batch endpoint to `app`"""
+
+    @app.route('/batch', methods=["POST"])
+    def batch():
+        body = request.get_json()
+        sub_requests = body.get('requests') if isinstance(body, dict) else None
+        _validate(sub_requests)
+
+        results = []
+        set_cookies = []
+        # name -> "name=value" of the cookies set so far
+        cookies = {}
+        with shared_connections(db.session):
+            for sub_request in sub_requests:
+                response = _dispatch(app, sub_request, cookies)
+                for set_cookie in response.headers.getlist('Set-Cookie'):
+                    set_cookies.append(set_cookie)
+                    pair = set_cookie.split(';', 1)[0].strip()
+                    cookies[pair.partition('=')[0]] = pair
+                results.append({
+                    "status": response.status_code,
+                    "body": response.get_json() if response.is_json else response.get_data(as_text=True)
+                })
+
+        response = jsonify({
+            "success": True,
+            "responses": results
+        })
+        for set_cookie in set_cookies:
+            response.headers.add('Set-Cookie', set_cookie)
+        return response
@@ -0,0 +1,104 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, current_app, g
+
+from models import on_question_change, on_category_change
+
+"""
+ResponseCache
+    keeps the encoded JSON of read-only GET responses, keyed by path and
+    query string (so by endpoint, category and page). Every entry carries an
+    ETag and the data version it was rendered at; question and category
+    writes bump the version, which retires all older entries at once. The
+    least recently used entries are evicted past `max_entries`, and entries
+    expire after `max_age` seconds so writes from other workers show up.
+    Each app keeps its own cache in app.extensions['response_cache'], so
+    apps on different databases never serve each other's pages.
+
+    A client that wrote within DB_REPLICA_STICKY_SECONDS (its GETs are pinned
+    to the primary, g.db_read_only is False) bypasses the cache, so it never
+    gets a page this worker rendered before its write. Only the database
+    reads are fresh for it: the totals of question_counts and the quiz pools
+    of question_index may lag up to COUNT_CACHE_SECONDS, category_catalog up
+    to CATALOG_CACHE_SECONDS, and the question snapshot until the worker that
+    took the write has rebuilt it, when the write went to another worker.
+"""
+
+RESPONSE_CACHE_SIZE = 512
+RESPONSE_CACHE_SECONDS = 30
+
+
+class ResponseCache:
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, max_age=RESPONSE_CACHE_SECONDS):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.version = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        on_question_change(self.bump)
+        on_category_change(self.bump)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            version, created_at, etag, body, mimetype = entry
+            if version != self.version or time.monotonic() - created_at >= self.max_age:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return etag, body, mimetype
+
+    def put(self, key, version, body, mimetype):
+        etag = hashlib.sha1(body).hexdigest()
+        with self._lock:
+            if version == self.version:
+                self._entries[key] = (version, time.monotonic(), etag, body, mimetype)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return etag, body, mimetype
+
+    def bump(self, *args):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+
+
+def cached_response(view):
+    """Serves a GET view from the app's response cache and answers
+    If-None-Match with 304. Only 200 responses are stored."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method == 'GET' and not g.get('db_read_only', True):
+            # pinned to the primary after a write: neither read nor store
+            return view(*args, **kwargs)
+
+        response_cache = current_app.extensions['response_cache']
+        key = request.full_path
+        entry = response_cache.get(key)
+
+        if entry is None:
+            version = response_cache.version
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            entry = response_cache.put(key, version, response.get_data(), response.mimetype)
+
+        etag, body, mimetype = entry
+        # weak match: compression turns the ETag of an encoded body weak
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(body, mimetype=mimetype)
+        response.set_etag(etag)
+        return response
+
+    return wrapper
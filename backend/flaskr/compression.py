@@ -0,0 +1,93 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+"""
+Compression
+    negotiated gzip (or brotli, when the brotli package is installed)
+    for responses larger than COMPRESS_MIN_SIZE. Bodies that carry an ETag,
+    such as those from the response cache, are compressed once and the
+    result is kept in a small LRU keyed by ETag and encoding. The ETag of a
+    compressed body is marked weak, since its bytes differ per encoding.
+"""
+
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 6
+COMPRESSED_CACHE_SIZE = 256
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/csv', 'text/plain'}
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, COMPRESS_LEVEL)
+
+
+class CompressedCache:
+
+    def __init__(self, max_entries=COMPRESSED_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def compress(self, etag, body, encoding):
+        if etag is None:
+            return _compress(body, encoding)
+
+        key = (etag, encoding)
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+                return compressed
+
+        compressed = _compress(body, encoding)
+        with self._lock:
+            self._entries[key] = compressed
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compressed
+
+
+def choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def init_compression(app, min_size=COMPRESS_MIN_SIZE):
+    """Compresses the eligible responses of `app` in an after_request hook"""
+    compressed_cache = CompressedCache()
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200
+                or response.direct_passthrough
+                or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        body = response.get_data()
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None or len(body) < min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        response.set_data(compressed_cache.compress(etag, body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            response.set_etag(etag, weak=True)
+        return response
+
+    return compressed_cache
@@ -0,0 +1,184 @@
+import threading
+import time
+
+from flask import g, has_request_context, request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from models import db, on_rows_read
+
+"""
+Metrics
+    opt-in per-request instrumentation. SQLAlchemy engine events count the
+    queries, SQL time and rows of each request (where the driver does not
+    report the rows of a SELECT, those read through Question.format_rows), a timing JSON encoder
+    measures serialization, and before/after_request measure the handler.
+    Every response gets a Server-Timing header, and the totals per endpoint
+    are exposed on /metrics in the Prometheus text format.
+"""
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_listening = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # the same check as _after_cursor_execute, or apps without metrics would
+    # grow the list of every pooled connection
+    if has_request_context() and 'metrics' in g:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or 'metrics' not in g:
+        return
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    stats = g.metrics
+    stats['queries'] += 1
+    stats['sql'] += time.perf_counter() - started.pop()
+    if statement.lstrip()[:6].upper() == 'SELECT':
+        # psycopg2 knows the size of a SELECT result up front, SQLite does not:
+        # its rows are counted by _on_rows_read instead
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            stats['rows'] += cursor.rowcount
+        else:
+            stats['rows_unreported'] = True
+
+
+def _handle_error(context):
+    # a statement that raised never reaches _after_cursor_execute
+    started = context.connection.info.get('query_started') if context.connection is not None else None
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    if has_request_context() and 'metrics' in g:
+        g.metrics['queries'] += 1
+        g.metrics['sql'] += seconds
+
+
+def _on_rows_read(count):
+    if has_request_context() and g.get('metrics', {}).get('rows_unreported'):
+        g.metrics['rows'] += count
+
+
+def _on_load(target, context):
+    if has_request_context() and 'metrics' in g:
+        g.metrics['objects'] += 1
+
+
+def _listen():
+    global _listening
+    if _listening:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    event.listen(db.Model, 'load', _on_load, propagate=True)
+    on_rows_read(_on_rows_read)
+    _listening = True
+
+
+class Metrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, method, status, stats, duration):
+        key = (endpoint, method, str(status))
+        with self._lock:
+            totals = self._endpoints.get(key)
+            if totals is None:
+                totals = self._endpoints[key] = {
+                    'requests': 0, 'seconds': 0.0, 'queries': 0, 'sql': 0.0,
+                    'rows': 0, 'objects': 0, 'serialize': 0.0,
+                    'buckets': [0] * len(LATENCY_BUCKETS)
+                }
+            totals['requests'] += 1
+            totals['seconds'] += duration
+            for name in ('queries', 'sql', 'rows', 'objects', 'serialize'):
+                totals[name] += stats[name]
+            for position, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    totals['buckets'][position] += 1
+
+    def render(self):
+        """Returns the totals in the Prometheus text exposition format"""
+        with self._lock:
+            endpoints = {key: dict(totals, buckets=list(totals['buckets']))
+                         for key, totals in self._endpoints.items()}
+
+        lines = []
+        series = [
+            ('trivia_requests_total', 'counter', 'Requests handled', 'requests'),
+            ('trivia_sql_queries_total', 'counter', 'SQL statements executed', 'queries'),
+            ('trivia_sql_seconds_total', 'counter', 'Time spent in SQL', 'sql'),
+            ('trivia_sql_rows_total', 'counter', 'Rows returned by SELECT statements', 'rows'),
+            ('trivia_orm_objects_total', 'counter', 'ORM objects loaded', 'objects'),
+            ('trivia_serialize_seconds_total', 'counter', 'Time spent encoding JSON', 'serialize'),
+        ]
+        for name, kind, help, field in series:
+            lines.append('# HELP {} {}'.format(name, help))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for (endpoint, method, status), totals in sorted(endpoints.items()):
+                lines.append('{}{{endpoint="{}",method="{}",status="{}"}} {}'.format(
+                    name, endpoint, method, status, totals[field]))
+
+        name = 'trivia_request_duration_seconds'
+        lines.append('# HELP {} Request handling time'.format(name))
+        lines.append('# TYPE {} histogram'.format(name))
+        for (endpoint, method, status), totals in sorted(endpoints.items()):
+            labels = 'endpoint="{}",method="{}",status="{}"'.format(endpoint, method, status)
+            for bound, count in zip(LATENCY_BUCKETS, totals['buckets']):
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, count))
+            lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(name, labels, totals['requests']))
+            lines.append('{}_sum{{{}}} {}'.format(name, labels, totals['seconds']))
+            lines.append('{}_count{{{}}} {}'.format(name, labels, totals['requests']))
+
+        return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    """Instruments `app` and adds the /metrics endpoint"""
+    _listen()
+    metrics = app.extensions['metrics'] = Metrics()
+
+    class TimedJSONEncoder(app.json_encoder):
+        def encode(self, o):
+            started = time.perf_counter()
+            try:
+                return super().encode(o)
+            finally:
+                if has_request_context() and 'metrics' in g:
+                    g.metrics['serialize'] += time.perf_counter() - started
+
+    app.json_encoder = TimedJSONEncoder
+
+    @app.before_request
+    def start_metrics():
+        g.metrics = {'started': time.perf_counter(), 'queries': 0, 'sql': 0.0,
+                     'rows': 0, 'objects': 0, 'serialize': 0.0}
+
+    @app.after_request
+    def record_metrics(response):
+        stats = g.get('metrics')
+        if stats is None:
+            return response
+        duration = time.perf_counter() - stats['started']
+        response.headers['Server-Timing'] = ', '.join([
+            'db;dur={:.3f};desc="{} queries, {} rows"'.format(
+                stats['sql'] * 1000, stats['queries'], stats['rows'] or stats['objects']),
+            'serialize;dur={:.3f}'.format(stats['serialize'] * 1000),
+            'total;dur={:.3f}'.format(duration * 1000),
+        ])
+        metrics.record(request.endpoint or 'unmatched', request.method,
+                       response.status_code, stats, duration)
+        return response
+
+    @app.route('/metrics', methods=["GET"])
+    def get_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    return metrics
@@ -0,0 +1,117 @@
+import secrets
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+"""
+Quiz sessions
+    server-side state for a quiz game, so each step only sends a session id.
+    A session holds a shuffled sequence of question ids drawn when the game
+    starts and a read position; "next question" is a pop from the front.
+
+    Stores share one interface: create(), next_id() and delete().
+    MemoryQuizStore is an LRU with a TTL inside the worker process;
+    RedisQuizStore keeps sessions in any Redis-compatible server so every
+    worker sees them.
+"""
+
+QUIZ_SESSION_QUESTIONS = 100
+QUIZ_SESSION_SECONDS = 3600
+QUIZ_SESSION_LIMIT = 100000
+
+
+class SessionNotFound(Exception):
+    pass
+
+
+def new_session_id():
+    return secrets.token_urlsafe(16)
+
+
+class MemoryQuizStore:
+
+    def __init__(self, max_sessions=QUIZ_SESSION_LIMIT, ttl=QUIZ_SESSION_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+
+    def create(self, session_id, category, question_ids):
+        with self._lock:
+            self._sessions[session_id] = {
+                'expires_at': time.monotonic() + self.ttl,
+                'category': category,
+                'ids': array('l', question_ids),
+                'position': 0
+            }
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def next_id(self, session_id):
+        """Returns (category, next question id or None when the quiz is over)"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session['expires_at'] < time.monotonic():
+                self._sessions.pop(session_id, None)
+                raise SessionNotFound(session_id)
+
+            self._sessions.move_to_end(session_id)
+            session['expires_at'] = time.monotonic() + self.ttl
+            if session['position'] >= len(session['ids']):
+                return session['category'], None
+            question_id = session['ids'][session['position']]
+            session['position'] += 1
+            return session['category'], question_id
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class RedisQuizStore:
+
+    def __init__(self, client, ttl=QUIZ_SESSION_SECONDS, prefix='trivia:quiz:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def create(self, session_id, category, question_ids):
+        key = self.prefix + session_id
+        pipe = self.client.pipeline()
+        # the category key marks the session as alive even once the ids run out
+        pipe.set(key + ':category', '' if category is None else category, ex=self.ttl)
+        if question_ids:
+            pipe.rpush(key, *question_ids)
+            pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def next_id(self, session_id):
+        key = self.prefix + session_id
+        pipe = self.client.pipeline()
+        pipe.get(key + ':category')
+        pipe.lpop(key)
+        pipe.expire(key, self.ttl)
+        pipe.expire(key + ':category', self.ttl)
+        category, question_id = pipe.execute()[:2]
+
+        if category is None:
+            raise SessionNotFound(session_id)
+        category = int(category) if category else None
+        return category, int(question_id) if question_id is not None else None
+
+    def delete(self, session_id):
+        key = self.prefix + session_id
+        self.client.delete(key, key + ':category')
+
+
+def make_store(url=None):
+    """'memory' (or nothing) for the in-process store, or a redis:// URL"""
+    if not url or url == 'memory':
+        return MemoryQuizStore()
+    return RedisQuizStore.from_url(url)
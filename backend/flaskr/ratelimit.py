@@ -0,0 +1,137 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, request, jsonify
+
+"""
+Rate limiting
+    admission control for the expensive routes. Every (client, endpoint)
+    pair gets a token bucket holding up to `burst` tokens and refilled at
+    `rate` tokens a second; a request that finds the bucket empty is refused
+    with 429 and a Retry-After of the time until the next token. Each limited
+    endpoint also admits at most `max_in_flight` requests at once per worker,
+    and the rest are refused with 503 straight away instead of queuing for a
+    database connection.
+
+    Bucket stores share one interface: take(key, rate, burst), which returns
+    0 when a token was taken or the seconds to wait for one. MemoryBucketStore
+    keeps buckets inside the worker process; RedisBucketStore keeps them in
+    any Redis-compatible server so every worker shares the same budget.
+"""
+
+# endpoint -> (requests per second, burst, concurrent requests per worker)
+RATE_LIMITS = {
+    'search_or_question': (5, 20, 8),
+    'play_quiz': (10, 30, 16),
+    'create_quiz_session': (2, 10, 8),
+}
+RATE_LIMIT_CLIENTS = 100000
+OVERLOADED_RETRY_SECONDS = 1
+
+
+class MemoryBucketStore:
+
+    def __init__(self, max_clients=RATE_LIMIT_CLIENTS):
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # the least recently seen clients have the fullest buckets anyway
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(bucket[1]) or burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(now - updated_at, 0) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HMSET', KEYS[1], 'tokens', tokens, 'at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+
+    def __init__(self, client, prefix='trivia:rate:'):
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(TAKE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def take(self, key, rate, burst):
+        return float(self._take(keys=[self.prefix + key], args=[rate, burst, time.time()]))
+
+
+def make_bucket_store(url=None):
+    """'memory' (or nothing) for the in-process store, or a redis:// URL"""
+    if not url or url == 'memory':
+        return MemoryBucketStore()
+    return RedisBucketStore.from_url(url)
+
+
+def refused(status, message, retry_after):
+    response = jsonify({"success": False, "error": status, "message": message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def init_rate_limits(app, limits=RATE_LIMITS, store=None):
+    """Limits the endpoints named in `limits` with before/teardown_request hooks"""
+    store = store or MemoryBucketStore()
+    in_flight = {endpoint: threading.BoundedSemaphore(max_in_flight)
+                 for endpoint, (rate, burst, max_in_flight) in limits.items()}
+
+    @app.before_request
+    def admit_request():
+        limit = limits.get(request.endpoint)
+        if limit is None or request.method == 'OPTIONS':
+            return None
+        rate, burst, max_in_flight = limit
+
+        # behind a proxy, wrap the app in werkzeug's ProxyFix so this is the client
+        client = request.remote_addr or 'unknown'
+        wait = store.take('{}:{}'.format(request.endpoint, client), rate, burst)
+        if wait:
+            return refused(429, "too many requests", max(int(math.ceil(wait)), 1))
+
+        if not in_flight[request.endpoint].acquire(blocking=False):
+            return refused(503, "server busy", OVERLOADED_RETRY_SECONDS)
+        g.admitted_endpoint = request.endpoint
+        return None
+
+    @app.teardown_request
+    def release_request(error=None):
+        endpoint = g.pop('admitted_endpoint', None)
+        if endpoint is not None:
+            in_flight[endpoint].release()
+
+    return store
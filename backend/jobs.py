@@ -0,0 +1,325 @@
+import inspect
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from models import db, Question, QuestionBatch, QuestionStats, Category, Job, JOB_ACTIVE_STATUSES, \
+    category_catalog, question_changed
+from analytics import suggested_difficulty
+from bulk import BATCH_SIZE, export_questions
+
+"""
+jobs
+    maintenance work that would time out in a request handler. A submitted
+    job is stored as a row of the jobs table and handed to a small thread
+    pool in the submitting worker; the job writes its status, progress and
+    result back to that row, so any worker can report on it.
+
+    At most `max_active` jobs may be queued or running at once across all
+    workers, and at most `workers` run at once in one process. A job checks
+    for cancellation whenever it reports progress. Jobs still queued or
+    running after JOB_STALE_SECONDS without a progress report (their worker
+    went away) are marked failed when the next job is submitted.
+
+    Job types are plain functions registered with @job_type(name, check);
+    they take a JobContext first and their params as keyword arguments, and
+    return a JSON-serialisable result. `check`, called with the same params
+    when the job is submitted, returns them normalised or raises JobError,
+    so bad params are refused before a job is queued.
+"""
+
+JOB_WORKERS = 2
+MAX_ACTIVE_JOBS = 8
+JOB_STALE_SECONDS = 3600
+# progress is written at most this often
+JOB_PROGRESS_SECONDS = 1
+# shared by the workers, so any of them can serve a finished export
+JOB_EXPORT_DIR = os.getenv('JOB_EXPORT_DIR') or os.path.join(tempfile.gettempdir(), 'trivia-exports')
+# rebuild_search_index: name of the copy, and how long the swap waits for its lock
+REBUILD_INDEX_NAME = 'ix_questions_question_trgm_rebuild'
+REBUILD_INDEX_LOCK_TIMEOUT = '5s'
+
+# name -> (function, check)
+JOB_TYPES = {}
+
+
+def job_type(name, check=None):
+    def register(function):
+        JOB_TYPES[name] = (function, check)
+        return function
+    return register
+
+
+class JobError(Exception):
+    pass
+
+
+def _integer(name, value):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise JobError('{} must be an integer'.format(name))
+    return value
+
+
+def _boolean(name, value):
+    if not isinstance(value, bool):
+        raise JobError('{} must be true or false'.format(name))
+    return value
+
+
+class JobsBusy(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """Handed to a running job to report progress and notice cancellation"""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self._reported_at = 0
+
+    def progress(self, fraction, force=False):
+        """Records progress (0 to 1); raises JobCancelled once cancel was asked"""
+        now = time.time()
+        if not force and now - self._reported_at < JOB_PROGRESS_SECONDS:
+            return
+        self._reported_at = now
+        # a connection of its own, so the job's unfinished work is not committed
+        with db.engine.begin() as connection:
+            connection.execute(
+                Job.__table__.update().where(Job.id == self.id)
+                .values(progress=min(max(fraction, 0), 1), updated_at=now))
+            cancel_requested = connection.execute(
+                db.select([Job.cancel_requested]).where(Job.id == self.id)).scalar()
+        if cancel_requested:
+            raise JobCancelled()
+
+
+class JobRunner:
+
+    def __init__(self, app, workers=JOB_WORKERS, max_active=MAX_ACTIVE_JOBS):
+        self.app = app
+        self.workers = workers
+        self.max_active = max_active
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def submit(self, type, params=None):
+        """Stores a queued job and starts it when a pool thread is free"""
+        params = params or {}
+        if type not in JOB_TYPES:
+            raise JobError('unknown job type {}'.format(type))
+        if not isinstance(params, dict):
+            raise JobError('params must be an object')
+        function, check = JOB_TYPES[type]
+        try:
+            inspect.signature(function).bind(None, **params)
+        except TypeError as e:
+            raise JobError(str(e))
+        if check is not None:
+            params = check(**params)
+
+        now = time.time()
+        Job.query.filter(Job.status.in_(JOB_ACTIVE_STATUSES),
+                         Job.updated_at < now - JOB_STALE_SECONDS) \
+            .update({'status': 'failed', 'error': 'interrupted', 'finished_at': now},
+                    synchronize_session=False)
+        if Job.query.filter(Job.status.in_(JOB_ACTIVE_STATUSES)).count() >= self.max_active:
+            db.session.commit()
+            raise JobsBusy()
+
+        job = Job(type=type, params=json.dumps(params), status='queued',
+                  created_at=now, updated_at=now)
+        db.session.add(job)
+        db.session.commit()
+
+        with self._lock:
+            if self._executor is None:
+                # started on the first job, so workers that never run one have no threads
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='trivia-job')
+        self._executor.submit(self._run, job.id)
+        return job
+
+    def cancel(self, job_id):
+        """Cancels a queued job, or asks a running one to stop.
+
+        Returns the job, or None when it does not exist; raises JobError
+        when it already finished.
+        """
+        now = time.time()
+        cancelled = Job.query.filter(Job.id == job_id, Job.status == 'queued') \
+            .update({'status': 'cancelled', 'finished_at': now, 'updated_at': now},
+                    synchronize_session=False)
+        if not cancelled:
+            Job.query.filter(Job.id == job_id, Job.status == 'running') \
+                .update({'cancel_requested': True}, synchronize_session=False)
+        db.session.commit()
+
+        job = Job.query.get(job_id)
+        if job is not None and job.status not in JOB_ACTIVE_STATUSES + ('cancelled',):
+            raise JobError('job {} already {}'.format(job_id, job.status))
+        return job
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            # only the thread that moves it out of 'queued' runs it
+            now = time.time()
+            started = Job.query.filter(Job.id == job_id, Job.status == 'queued') \
+                .update({'status': 'running', 'started_at': now, 'updated_at': now},
+                        synchronize_session=False)
+            db.session.commit()
+            if not started:
+                return
+
+            job = Job.query.get(job_id)
+            function, params = JOB_TYPES[job.type][0], json.loads(job.params or '{}')
+            values = {}
+            try:
+                result = function(JobContext(job_id), **params)
+                values = {'status': 'succeeded', 'progress': 1, 'result': json.dumps(result)}
+            except JobCancelled:
+                db.session.rollback()
+                values = {'status': 'cancelled'}
+            except Exception as e:
+                print(e)
+                db.session.rollback()
+                values = {'status': 'failed', 'error': str(e)}
+            finally:
+                now = time.time()
+                values.update(finished_at=now, updated_at=now)
+                Job.query.filter(Job.id == job_id).update(values, synchronize_session=False)
+                db.session.commit()
+
+
+"""
+Job types
+"""
+
+
+@job_type('rebuild_search_index')
+def rebuild_search_index(job):
+    """Rebuilds the trigram index on PostgreSQL while questions stay
+    writable; elsewhere reloads the in-process search index of this worker.
+
+    PostgreSQL 11 has no REINDEX CONCURRENTLY, so a copy is built with
+    CREATE INDEX CONCURRENTLY and swapped in under a lock held only for the
+    drop and rename.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+        with db.engine.execution_options(isolation_level='AUTOCOMMIT').connect() as connection:
+            connection.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            # an invalid index left by an interrupted rebuild
+            connection.execute('DROP INDEX CONCURRENTLY IF EXISTS {}'.format(REBUILD_INDEX_NAME))
+            connection.execute('CREATE INDEX CONCURRENTLY {} ON questions USING gin (question gin_trgm_ops)'
+                               .format(REBUILD_INDEX_NAME))
+        with db.engine.begin() as connection:
+            connection.execute("SET LOCAL lock_timeout = '{}'".format(REBUILD_INDEX_LOCK_TIMEOUT))
+            connection.execute('DROP INDEX IF EXISTS ix_questions_question_trgm')
+            connection.execute('ALTER INDEX {} RENAME TO ix_questions_question_trgm'.format(REBUILD_INDEX_NAME))
+    question_changed('bulk', None)
+    return {}
+
+
+def _check_export(format='jsonl'):
+    if format not in ('jsonl', 'csv'):
+        raise JobError('format must be jsonl or csv')
+    return {'format': format}
+
+
+def export_dir():
+    """JOB_EXPORT_DIR, created private to this user; refuses a directory
+    that another user owns or may write to"""
+    os.makedirs(JOB_EXPORT_DIR, mode=0o700, exist_ok=True)
+    status = os.lstat(JOB_EXPORT_DIR)
+    if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid() or status.st_mode & 0o022:
+        raise JobError('{} must be a directory only this user can write to'.format(JOB_EXPORT_DIR))
+    return JOB_EXPORT_DIR
+
+
+def export_path(job_id, format):
+    """Where the export_questions job `job_id` leaves its file"""
+    return os.path.join(JOB_EXPORT_DIR, 'trivia-questions-{}.{}'.format(job_id, format))
+
+
+@job_type('export_questions', _check_export)
+def export_questions_file(job, format='jsonl'):
+    """Writes the questions table to export_path(), served by
+    GET /jobs/<id>/download"""
+    total = max(Question.query.count(), 1)
+    descriptor, temporary = tempfile.mkstemp(suffix='.tmp', dir=export_dir())
+    try:
+        with os.fdopen(descriptor, 'w') as f:
+            # export_questions yields one chunk per BATCH_SIZE rows
+            for chunks, chunk in enumerate(export_questions(format), start=1):
+                f.write(chunk)
+                job.progress(chunks * BATCH_SIZE / total)
+        os.replace(temporary, export_path(job.id, format))
+    except BaseException:
+        # cancelled or failed: leave nothing behind
+        os.unlink(temporary)
+        raise
+    return {'format': format, 'download': '/jobs/{}/download'.format(job.id)}
+
+
+@job_type('recompute_difficulty')
+def recompute_difficulty(job):
+    """Sets the difficulty of each question with enough quiz answers to the
+    one suggested by its correct rate"""
+    rows = db.session.query(QuestionStats.question_id, QuestionStats.answered,
+                            QuestionStats.correct, Question.difficulty) \
+        .join(Question, Question.id == QuestionStats.question_id).all()
+
+    changes = {}
+    for question_id, answered, correct, difficulty in rows:
+        suggested = suggested_difficulty(answered, correct)
+        if suggested is not None and suggested != difficulty:
+            changes.setdefault(suggested, []).append(question_id)
+
+    total = max(sum(len(ids) for ids in changes.values()), 1)
+    updated = 0
+    for difficulty, ids in sorted(changes.items()):
+        for start in range(0, len(ids), BATCH_SIZE):
+            with QuestionBatch() as batch:
+                batch.update(ids[start:start + BATCH_SIZE], difficulty=difficulty)
+            updated += len(batch.updated_ids)
+            job.progress(updated / total)
+    return {'updated': updated}
+
+
+def _check_purge(category_id, delete_category=False):
+    category_id = _integer('category_id', category_id)
+    if category_catalog.get(category_id) is None:
+        raise JobError('unknown category {}'.format(category_id))
+    return {'category_id': category_id, 'delete_category': _boolean('delete_category', delete_category)}
+
+
+@job_type('purge_category', _check_purge)
+def purge_category(job, category_id, delete_category=False):
+    """Deletes every question of a category, a batch at a time, and the
+    category itself with delete_category"""
+
+    total = max(Question.query.filter(Question.category == category_id).count(), 1)
+    deleted = 0
+    while True:
+        ids = [question_id for question_id, in db.session.query(Question.id)
+               .filter(Question.category == category_id).order_by(Question.id).limit(BATCH_SIZE)]
+        if not ids:
+            break
+        with QuestionBatch() as batch:
+            batch.delete(ids)
+        deleted += len(batch.deleted_ids)
+        job.progress(deleted / total)
+
+    if delete_category:
+        category = Category.query.get(category_id)
+        if category is not None:
+            category.delete()
+    return {'deleted': deleted, 'category_deleted': bool(delete_category)}
@@ -0,0 +1,48 @@
+--
+-- Types questions.category as an integer foreign key to categories.id and
+-- adds the indexes used for category paging, quiz pools and difficulty
+-- filters. Safe to run more than once:
+--
+--   psql trivia < migrations/0001_question_category_fk.sql
+--
+
+BEGIN;
+
+-- databases created by db.create_all() before this change have a text
+-- column; values that are not a category id become NULL
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'questions' AND column_name = 'category'
+       ) <> 'integer' THEN
+        ALTER TABLE public.questions
+            ALTER COLUMN category TYPE integer USING
+                CASE WHEN btrim(category::text) ~ '^[0-9]{1,9}$' THEN btrim(category::text)::integer END;
+    END IF;
+END
+$$;
+
+-- questions pointing at a category that no longer exists lose their category
+UPDATE public.questions SET category = NULL
+WHERE category IS NOT NULL
+  AND category NOT IN (SELECT id FROM public.categories);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'public.questions'::regclass AND contype = 'f'
+    ) THEN
+        ALTER TABLE ONLY public.questions
+            ADD CONSTRAINT category FOREIGN KEY (category) REFERENCES public.categories(id)
+            ON UPDATE CASCADE ON DELETE SET NULL;
+    END IF;
+END
+$$;
+
+CREATE INDEX IF NOT EXISTS ix_questions_category_id ON public.questions USING btree (category, id);
+CREATE INDEX IF NOT EXISTS ix_questions_difficulty ON public.questions USING btree (difficulty);
+
+COMMIT;
+
+ANALYZE public.questions;
@@ -0,0 +1,14 @@
+--
+-- Adds the question_stats table that quiz analytics flush their counters
+-- into (see analytics.py). Safe to run more than once:
+--
+--   psql trivia < migrations/0002_question_stats.sql
+--
+
+CREATE TABLE IF NOT EXISTS public.question_stats (
+    question_id integer NOT NULL PRIMARY KEY
+        REFERENCES public.questions(id) ON DELETE CASCADE,
+    served integer NOT NULL DEFAULT 0,
+    answered integer NOT NULL DEFAULT 0,
+    correct integer NOT NULL DEFAULT 0
+);
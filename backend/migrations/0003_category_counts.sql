@@ -0,0 +1,61 @@
+--
+-- Adds the category_counts table, with the number of questions per
+-- (category, difficulty), and the triggers that keep it current on every
+-- insert, update and delete, COPY included. Needs PostgreSQL 10 or later.
+-- Safe to run more than once:
+--
+--   psql trivia < migrations/0003_category_counts.sql
+--
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.category_counts (
+    category integer NOT NULL,
+    difficulty integer NOT NULL,
+    questions integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (category, difficulty)
+);
+
+-- no writes may slip in between counting and creating the triggers
+LOCK TABLE public.questions IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE OR REPLACE FUNCTION count_question_changes() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO category_counts (category, difficulty, questions)
+        SELECT COALESCE(category, 0), COALESCE(difficulty, 0), count(*) FROM new_rows GROUP BY 1, 2
+        ON CONFLICT (category, difficulty)
+        DO UPDATE SET questions = category_counts.questions + excluded.questions;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO category_counts (category, difficulty, questions)
+        SELECT COALESCE(category, 0), COALESCE(difficulty, 0), -count(*) FROM old_rows GROUP BY 1, 2
+        ON CONFLICT (category, difficulty)
+        DO UPDATE SET questions = category_counts.questions + excluded.questions;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'questions_counted_insert') THEN
+        CREATE TRIGGER questions_counted_insert AFTER INSERT ON questions
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE PROCEDURE count_question_changes();
+        CREATE TRIGGER questions_counted_update AFTER UPDATE ON questions
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE PROCEDURE count_question_changes();
+        CREATE TRIGGER questions_counted_delete AFTER DELETE ON questions
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE PROCEDURE count_question_changes();
+    END IF;
+END
+$$;
+
+INSERT INTO public.category_counts (category, difficulty, questions)
+SELECT COALESCE(category, 0), COALESCE(difficulty, 0), count(*) FROM public.questions
+WHERE NOT EXISTS (SELECT 1 FROM public.category_counts)
+GROUP BY COALESCE(category, 0), COALESCE(difficulty, 0);
+
+COMMIT;
@@ -0,0 +1,23 @@
+--
+-- Adds the jobs table that background maintenance jobs record their
+-- status, progress and result in (see jobs.py). Safe to run more than once:
+--
+--   psql trivia < migrations/0004_jobs.sql
+--
+
+CREATE TABLE IF NOT EXISTS public.jobs (
+    id serial PRIMARY KEY,
+    type character varying NOT NULL,
+    params text,
+    status character varying NOT NULL,
+    progress double precision NOT NULL DEFAULT 0,
+    result text,
+    error text,
+    cancel_requested boolean NOT NULL DEFAULT false,
+    created_at double precision,
+    started_at double precision,
+    finished_at double precision,
+    updated_at double precision
+);
+
+CREATE INDEX IF NOT EXISTS ix_jobs_status ON public.jobs (status);
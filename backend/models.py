@@ -1,27 +1,117 @@
+import hashlib
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+import random
+import threading
+import time
+from array import array
+from sqlalchemy import Column, String, Integer, Float, Boolean, Text, ForeignKey, Index, DDL, \
+    create_engine, event, func
 from flask_sqlalchemy import SQLAlchemy
 import json
-from dbsetup import DB_HOST, DB_NAME, DB_PASSWORD, DB_USER
+from dbsetup import DB_HOST, DB_NAME, DB_PASSWORD, DB_USER, DATABASE_URL, \
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, \
+    DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT, DB_CREATE_ALL, DB_REPLICA_URLS
+from replicas import RoutingSQLAlchemy, ReplicaSet
 
 
-DB_PATH = 'postgresql+psycopg2://{}:{}@{}/{}'.format(
+DB_PATH = DATABASE_URL or 'postgresql+psycopg2://{}:{}@{}/{}'.format(
     DB_USER, DB_PASSWORD, DB_HOST, DB_NAME)
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 
 """
 setup_db(app)
-    binds a flask application and a SQLAlchemy service
+    binds a flask application and a SQLAlchemy service. Pool settings come
+    from dbsetup and only apply to server databases; the schema is created
+    only when create_all is set (see also `flask init-db`). Read-only
+    requests go to `replica_paths` when given, see replicas.py.
 """
 
 
-def setup_db(app, database_path=DB_PATH):
-    app.config["SQLALCHEMY_DATABASE_URI"] = DB_PATH
+def engine_options(database_path,
+                   pool_size=DB_POOL_SIZE,
+                   max_overflow=DB_MAX_OVERFLOW,
+                   pool_timeout=DB_POOL_TIMEOUT,
+                   pool_recycle=DB_POOL_RECYCLE,
+                   pool_pre_ping=DB_POOL_PRE_PING,
+                   statement_timeout=DB_STATEMENT_TIMEOUT):
+    if database_path.startswith('sqlite'):
+        return {}
+
+    options = {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': pool_pre_ping,
+    }
+    if statement_timeout and database_path.startswith('postgresql'):
+        options['connect_args'] = {
+            'options': '-c statement_timeout={}'.format(statement_timeout)
+        }
+    return options
+
+
+def setup_db(app, database_path=DB_PATH, create_all=DB_CREATE_ALL,
+             replica_paths=DB_REPLICA_URLS, **pool_settings):
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path, **pool_settings)
     db.app = app
     db.init_app(app)
-    db.create_all()
+    if replica_paths:
+        app.extensions['db_replicas'] = ReplicaSet(
+            replica_paths, engine_options(replica_paths[0], **pool_settings))
+    if create_all:
+        db.create_all()
+
+
+"""
+on_question_change(listener), on_category_change(listener)
+    register listener(action, row) to be called after a question or category
+    is inserted, updated or deleted, so in-process caches can stay current.
+    Bulk writes report action 'bulk' with row None: listeners should reload.
+"""
+
+_question_listeners = []
+
+
+def on_question_change(listener):
+    _question_listeners.append(listener)
+    return listener
+
+
+def question_changed(action, question):
+    for listener in _question_listeners:
+        listener(action, question)
+
+
+_category_listeners = []
+
+
+def on_category_change(listener):
+    _category_listeners.append(listener)
+    return listener
+
+
+def category_changed(action, category):
+    for listener in _category_listeners:
+        listener(action, category)
+
+
+"""
+on_rows_read(listener)
+    register listener(count) to be called when Question.format_rows() turns
+    `count` column tuples into dicts, so metrics can count the rows a read
+    returned where the database driver does not report it.
+"""
+
+_rows_listeners = []
+
+
+def on_rows_read(listener):
+    _rows_listeners.append(listener)
+    return listener
 
 
 """
@@ -36,25 +126,34 @@ class Question(db.Model):
     id = Column(Integer, primary_key=True)
     question = Column(String)
     answer = Column(String)
-    category = Column(String)
+    category = Column(Integer, ForeignKey('categories.id', onupdate='CASCADE', ondelete='SET NULL'))
     difficulty = Column(Integer)
 
+    # (category, id) serves ordered category pages and quiz pools as range scans
+    __table_args__ = (
+        Index('ix_questions_category_id', 'category', 'id'),
+        Index('ix_questions_difficulty', 'difficulty'),
+    )
+
     def __init__(self, question, answer, category, difficulty):
         self.question = question
         self.answer = answer
-        self.category = category
-        self.difficulty = difficulty
+        self.category = int(category)
+        self.difficulty = int(difficulty)
 
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        question_changed('insert', self)
 
     def update(self):
         db.session.commit()
+        question_changed('update', self)
 
     def delete(self):
         db.session.delete(self)
         db.session.commit()
+        question_changed('delete', self)
 
     def format(self):
         return {
@@ -65,6 +164,290 @@ class Question(db.Model):
             'difficulty': self.difficulty
         }
 
+    """
+    Read path for list endpoints: plain column tuples instead of tracked
+    ORM objects, turned straight into the same dicts as format().
+    """
+    FIELDS = ('id', 'question', 'answer', 'category', 'difficulty')
+
+    @classmethod
+    def rows(cls, *criteria):
+        return db.session.query(cls.id, cls.question, cls.answer, cls.category, cls.difficulty) \
+            .filter(*criteria)
+
+    @classmethod
+    def format_rows(cls, rows, fields=FIELDS):
+        """Formats a fetched list of rows holding `fields`"""
+        for listener in _rows_listeners:
+            listener(len(rows))
+        return [dict(zip(fields, row)) for row in rows]
+
+    @classmethod
+    def get_formatted(cls, question_id):
+        rows = cls.format_rows(cls.rows(cls.id == question_id).limit(1).all())
+        return rows[0] if rows else None
+
+
+"""
+QuestionStats
+    quiz counters per question: how often it was served, answered and
+    answered correctly. Rows are written in batches by analytics.py, never
+    on the request path.
+"""
+
+
+class QuestionStats(db.Model):
+    __tablename__ = 'question_stats'
+
+    question_id = Column(Integer, ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True)
+    served = Column(Integer, nullable=False, default=0)
+    answered = Column(Integer, nullable=False, default=0)
+    correct = Column(Integer, nullable=False, default=0)
+
+    def format(self):
+        return {
+            'question_id': self.question_id,
+            'served': self.served,
+            'answered': self.answered,
+            'correct': self.correct
+        }
+
+
+"""
+CategoryCount
+    number of questions per (category, difficulty), category 0 standing for
+    questions without one. Database triggers keep it current in the same
+    transaction as every insert, update and delete on questions, so ORM
+    writes, batches and COPY imports are all counted and nothing groups the
+    questions table per request. PostgreSQL counts once per statement from
+    its transition tables; SQLite once per row.
+"""
+
+
+class CategoryCount(db.Model):
+    __tablename__ = 'category_counts'
+
+    category = Column(Integer, primary_key=True)
+    difficulty = Column(Integer, primary_key=True)
+    questions = Column(Integer, nullable=False, default=0)
+
+    @classmethod
+    def by_category(cls):
+        """Returns {category or None: {difficulty: questions}}"""
+        counts = {}
+        rows = db.session.query(cls.category, cls.difficulty, cls.questions) \
+            .filter(cls.questions > 0).order_by(cls.category, cls.difficulty)
+        for category, difficulty, questions in rows:
+            counts.setdefault(category or None, {})[difficulty] = questions
+        return counts
+
+
+CATEGORY_COUNT_DDL = {
+    'postgresql': [
+        """
+        CREATE OR REPLACE FUNCTION count_question_changes() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO category_counts (category, difficulty, questions)
+                SELECT COALESCE(category, 0), COALESCE(difficulty, 0), count(*) FROM new_rows GROUP BY 1, 2
+                ON CONFLICT (category, difficulty)
+                DO UPDATE SET questions = category_counts.questions + excluded.questions;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO category_counts (category, difficulty, questions)
+                SELECT COALESCE(category, 0), COALESCE(difficulty, 0), -count(*) FROM old_rows GROUP BY 1, 2
+                ON CONFLICT (category, difficulty)
+                DO UPDATE SET questions = category_counts.questions + excluded.questions;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'questions_counted_insert') THEN
+                CREATE TRIGGER questions_counted_insert AFTER INSERT ON questions
+                    REFERENCING NEW TABLE AS new_rows
+                    FOR EACH STATEMENT EXECUTE PROCEDURE count_question_changes();
+                CREATE TRIGGER questions_counted_update AFTER UPDATE ON questions
+                    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                    FOR EACH STATEMENT EXECUTE PROCEDURE count_question_changes();
+                CREATE TRIGGER questions_counted_delete AFTER DELETE ON questions
+                    REFERENCING OLD TABLE AS old_rows
+                    FOR EACH STATEMENT EXECUTE PROCEDURE count_question_changes();
+            END IF;
+        END
+        $$
+        """,
+    ],
+    'sqlite': [
+        """
+        CREATE TRIGGER IF NOT EXISTS questions_counted_insert AFTER INSERT ON questions
+        BEGIN
+            INSERT INTO category_counts (category, difficulty, questions)
+            VALUES (COALESCE(NEW.category, 0), COALESCE(NEW.difficulty, 0), 1)
+            ON CONFLICT (category, difficulty) DO UPDATE SET questions = questions + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS questions_counted_update AFTER UPDATE OF category, difficulty ON questions
+        BEGIN
+            UPDATE category_counts SET questions = questions - 1
+            WHERE category = COALESCE(OLD.category, 0) AND difficulty = COALESCE(OLD.difficulty, 0);
+            INSERT INTO category_counts (category, difficulty, questions)
+            VALUES (COALESCE(NEW.category, 0), COALESCE(NEW.difficulty, 0), 1)
+            ON CONFLICT (category, difficulty) DO UPDATE SET questions = questions + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS questions_counted_delete AFTER DELETE ON questions
+        BEGIN
+            UPDATE category_counts SET questions = questions - 1
+            WHERE category = COALESCE(OLD.category, 0) AND difficulty = COALESCE(OLD.difficulty, 0);
+        END
+        """,
+    ],
+}
+
+# counts the questions already there when the table is first created
+CATEGORY_COUNT_FILL = """
+    INSERT INTO category_counts (category, difficulty, questions)
+    SELECT COALESCE(category, 0), COALESCE(difficulty, 0), count(*) FROM questions
+    WHERE NOT EXISTS (SELECT 1 FROM category_counts)
+    GROUP BY COALESCE(category, 0), COALESCE(difficulty, 0)
+"""
+
+# on the metadata, so they run once both tables exist
+for dialect, statements in CATEGORY_COUNT_DDL.items():
+    for statement in statements + [CATEGORY_COUNT_FILL]:
+        event.listen(db.metadata, 'after_create', DDL(statement).execute_if(dialect=dialect))
+
+
+"""
+Job
+    one run of a maintenance job (see jobs.py): its type and JSON params,
+    status (queued, running, succeeded, failed or cancelled), progress from
+    0 to 1, JSON result or error, and epoch timestamps. A cancel request on a
+    running job sets cancel_requested; the job stops at its next progress
+    report.
+"""
+
+JOB_ACTIVE_STATUSES = ('queued', 'running')
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    id = Column(Integer, primary_key=True)
+    type = Column(String, nullable=False)
+    params = Column(Text)
+    status = Column(String, nullable=False, default='queued', index=True)
+    progress = Column(Float, nullable=False, default=0)
+    result = Column(Text)
+    error = Column(Text)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    created_at = Column(Float)
+    started_at = Column(Float)
+    finished_at = Column(Float)
+    updated_at = Column(Float)
+
+    def format(self):
+        return {
+            'id': self.id,
+            'type': self.type,
+            'params': json.loads(self.params) if self.params else {},
+            'status': self.status,
+            'progress': self.progress,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'cancel_requested': self.cancel_requested,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+"""
+QuestionBatch
+    unit of work for many question writes at once. Inserts, bulk updates
+    and deletes by id are queued on the session and committed in a single
+    transaction when the `with` block ends (or on commit()); caches are
+    notified once with a 'bulk' change.
+
+        with QuestionBatch() as batch:
+            batch.update([1, 2, 3], difficulty=4)
+            batch.delete([7, 8])
+        batch.updated_ids, batch.deleted_ids
+"""
+
+UPDATABLE_FIELDS = ('difficulty', 'category')
+DIFFICULTY_LEVELS = (1, 2, 3, 4, 5)
+# the largest value an Integer column holds on PostgreSQL
+MAX_ID = 2 ** 31 - 1
+
+
+class QuestionBatch:
+
+    def __init__(self):
+        self.inserted = []
+        self.inserted_ids = []
+        self.updated_ids = []
+        self.deleted_ids = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            db.session.rollback()
+        return False
+
+    def insert(self, questions):
+        questions = list(questions)
+        db.session.add_all(questions)
+        self.inserted.extend(questions)
+
+    def update(self, ids, **values):
+        """Sets difficulty and/or category on every question in `ids`"""
+        unknown = set(values) - set(UPDATABLE_FIELDS)
+        if unknown:
+            raise ValueError('cannot update {}'.format(', '.join(sorted(unknown))))
+        found = self._existing(ids)
+        if found and values:
+            Question.query.filter(Question.id.in_(found)) \
+                .update(values, synchronize_session=False)
+        self.updated_ids.extend(found)
+        return found
+
+    def delete(self, ids):
+        found = self._existing(ids)
+        if found:
+            Question.query.filter(Question.id.in_(found)) \
+                .delete(synchronize_session=False)
+        self.deleted_ids.extend(found)
+        return found
+
+    def commit(self):
+        try:
+            db.session.flush()
+            self.inserted_ids = [question.id for question in self.inserted]
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            raise
+        if self.inserted_ids or self.updated_ids or self.deleted_ids:
+            question_changed('bulk', None)
+
+    def _existing(self, ids):
+        ids = sorted(set(int(question_id) for question_id in ids))
+        if not ids:
+            return []
+        return [question_id for question_id, in
+                db.session.query(Question.id).filter(Question.id.in_(ids)).order_by(Question.id)]
+
 
 """
 Category
@@ -81,8 +464,303 @@ class Category(db.Model):
     def __init__(self, type):
         self.type = type
 
+    def insert(self):
+        db.session.add(self)
+        db.session.commit()
+        category_changed('insert', self)
+
+    def update(self):
+        db.session.commit()
+        category_changed('update', self)
+
+    def delete(self):
+        db.session.delete(self)
+        db.session.commit()
+        category_changed('delete', self)
+
     def format(self):
         return {
             'id': self.id,
             'type': self.type
         }
+
+
+"""
+CategoryCatalog
+    serves the formatted categories from memory. The catalog is loaded on
+    first use, dropped by Category writes and reloaded
+    after CATALOG_CACHE_SECONDS so changes made by other workers show up.
+"""
+
+CATALOG_CACHE_SECONDS = 300
+
+
+class CategoryCatalog:
+
+    def __init__(self, max_age=CATALOG_CACHE_SECONDS):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._categories = None
+        self._by_id = {}
+        self._version = None
+        self._loaded_at = 0
+
+    def all(self):
+        """Returns Category.format() dicts ordered by id"""
+        return self._load()[0]
+
+    def get(self, category_id):
+        """Returns the formatted category with this id, or None"""
+        try:
+            category_id = int(category_id)
+        except (TypeError, ValueError):
+            return None
+        return self._load()[1].get(category_id)
+
+    def version(self):
+        """Returns a short hash of the catalog, the same in every worker"""
+        return self._load()[2]
+
+    def invalidate(self):
+        with self._lock:
+            self._categories = None
+
+    def _load(self):
+        with self._lock:
+            if self._categories is not None and time.monotonic() - self._loaded_at < self.max_age:
+                return self._categories, self._by_id, self._version
+
+        categories = [category.format() for category in Category.query.order_by(Category.id).all()]
+        by_id = {category['id']: category for category in categories}
+        version = hashlib.sha1(json.dumps(categories, sort_keys=True).encode()).hexdigest()[:12]
+
+        with self._lock:
+            self._categories = categories
+            self._by_id = by_id
+            self._version = version
+            self._loaded_at = time.monotonic()
+        return categories, by_id, version
+
+
+category_catalog = CategoryCatalog()
+on_category_change(lambda action, category: category_catalog.invalidate())
+
+
+"""
+QuestionCounter
+    caches the number of questions per category, summed from the small
+    category_counts table. Writes made through this process adjust the
+    cached counts directly; the cache is reloaded after COUNT_CACHE_SECONDS
+    so writes from other workers show up as well.
+"""
+
+COUNT_CACHE_SECONDS = 30
+
+
+class QuestionCounter:
+
+    def __init__(self, max_age=COUNT_CACHE_SECONDS):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._by_category = None
+        self._loaded_at = 0
+
+    def total(self, category=None):
+        counts = self._counts()
+        if category is None:
+            return sum(counts.values())
+        return counts.get(int(category), 0)
+
+    def invalidate(self):
+        with self._lock:
+            self._by_category = None
+
+    def _counts(self):
+        with self._lock:
+            counts = self._by_category
+            if counts is not None and time.monotonic() - self._loaded_at < self.max_age:
+                return counts
+
+        rows = db.session.query(CategoryCount.category, func.sum(CategoryCount.questions)) \
+            .group_by(CategoryCount.category).all()
+        # category 0 holds the questions without a category
+        counts = {category or None: int(total) for category, total in rows}
+
+        with self._lock:
+            self._by_category = counts
+            self._loaded_at = time.monotonic()
+        return counts
+
+    def _on_change(self, action, question):
+        with self._lock:
+            if self._by_category is None:
+                return
+            if action not in ('insert', 'delete'):
+                # the previous category of an updated row is unknown here
+                self._by_category = None
+                return
+            key = question.category
+            step = 1 if action == 'insert' else -1
+            counts = dict(self._by_category)
+            counts[key] = max(counts.get(key, 0) + step, 0)
+            self._by_category = counts
+
+
+question_counts = QuestionCounter()
+on_question_change(question_counts._on_change)
+
+
+"""
+QuestionIndex
+    keeps the question ids in memory, split into one pool per (category,
+    difficulty), so random unseen questions can be drawn without loading
+    the question pool. A pool is a compact array of ids plus an
+    id -> position map, giving O(1) adds, removes and random draws; draws
+    over several pools first choose a pool weighted by its size. Like
+    QuestionCounter it follows local writes and reloads after
+    COUNT_CACHE_SECONDS.
+"""
+
+
+class _IdPool:
+
+    def __init__(self):
+        self.ids = array('l')
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, question_id):
+        if question_id not in self.positions:
+            self.positions[question_id] = len(self.ids)
+            self.ids.append(question_id)
+
+    def remove(self, question_id):
+        position = self.positions.pop(question_id, None)
+        if position is None:
+            return
+        last = self.ids.pop()
+        if last != question_id:
+            self.ids[position] = last
+            self.positions[last] = position
+
+
+class QuestionIndex:
+
+    # random draws tried before falling back to a scan of the remaining ids
+    MAX_DRAWS = 16
+
+    def __init__(self, max_age=COUNT_CACHE_SECONDS):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._pools = None
+        self._loaded_at = 0
+
+    def pick(self, category=None, exclude=(), difficulty=None):
+        """Returns a random question id of `category` and `difficulty` (any
+        when None) that is not in `exclude`, or None when none is left."""
+        exclude = set(exclude)
+        pools = self._matching(category, difficulty)
+
+        with self._lock:
+            total = sum(len(pool) for pool in pools)
+            if len(exclude) < total:
+                for _ in range(self.MAX_DRAWS):
+                    question_id = self._draw(pools, random.randrange(total))
+                    if question_id not in exclude:
+                        return question_id
+            remaining = [question_id for pool in pools for question_id in pool.ids
+                         if question_id not in exclude]
+
+        return random.choice(remaining) if remaining else None
+
+    def sample(self, category=None, count=None, difficulty=None):
+        """Returns up to `count` distinct ids of `category` in random order"""
+        if count is None:
+            count = self.size(category, difficulty)
+        chosen = []
+        seen = set()
+        while len(chosen) < count:
+            question_id = self.pick(category, seen, difficulty)
+            if question_id is None:
+                break
+            chosen.append(question_id)
+            seen.add(question_id)
+        return chosen
+
+    def size(self, category=None, difficulty=None):
+        pools = self._matching(category, difficulty)
+        with self._lock:
+            return sum(len(pool) for pool in pools)
+
+    def difficulties(self, category=None):
+        """Returns the difficulty levels that have questions in `category`"""
+        # a write may drop self._pools meanwhile; read the pools this call loaded
+        pools = self._current()
+        with self._lock:
+            return sorted({difficulty for (pool_category, difficulty), pool in pools.items()
+                           if len(pool) and difficulty is not None
+                           and (category is None or pool_category == int(category))})
+
+    def discard(self, question_id):
+        with self._lock:
+            if self._pools is not None:
+                for pool in self._pools.values():
+                    pool.remove(question_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._pools = None
+
+    @staticmethod
+    def _draw(pools, position):
+        for pool in pools:
+            if position < len(pool):
+                return pool.ids[position]
+            position -= len(pool)
+
+    def _current(self):
+        with self._lock:
+            pools = self._pools
+            if pools is None or time.monotonic() - self._loaded_at >= self.max_age:
+                pools = None
+        if pools is None:
+            pools = self._load()
+        return pools
+
+    def _matching(self, category, difficulty):
+        pools = self._current()
+        category = None if category is None else int(category)
+        difficulty = None if difficulty is None else int(difficulty)
+        return [pool for (pool_category, pool_difficulty), pool in pools.items()
+                if (category is None or pool_category == category)
+                and (difficulty is None or pool_difficulty == difficulty)]
+
+    def _load(self):
+        pools = {}
+        rows = db.session.query(Question.id, Question.category, Question.difficulty).order_by(Question.id)
+        for question_id, category, difficulty in rows:
+            pools.setdefault((category, difficulty), _IdPool()).add(question_id)
+
+        with self._lock:
+            self._pools = pools
+            self._loaded_at = time.monotonic()
+        return pools
+
+    def _on_change(self, action, question):
+        with self._lock:
+            if self._pools is None:
+                return
+            if action not in ('insert', 'delete'):
+                self._pools = None
+                return
+            pool = self._pools.setdefault((question.category, question.difficulty), _IdPool())
+            if action == 'insert':
+                pool.add(question.id)
+            else:
+                pool.remove(question.id)
+
+
+question_index = QuestionIndex()
+on_question_change(question_index._on_change)
@@ -0,0 +1,117 @@
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, orm
+
+"""
+Read replicas
+    requests marked read-only (g.db_read_only) run their queries on a
+    replica, chosen round-robin per request among the healthy ones; flushes
+    and every other request use the primary. A replica is probed with
+    SELECT 1 at most every HEALTH_CHECK_SECONDS and skipped for
+    DOWN_SECONDS after a failed probe. With no healthy replica, reads go to
+    the primary.
+"""
+
+HEALTH_CHECK_SECONDS = 10
+DOWN_SECONDS = 30
+
+
+class Replica:
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.checked_at = 0
+        self.down_until = 0
+
+
+class ReplicaSet:
+
+    def __init__(self, database_paths, engine_options=None):
+        self._lock = threading.Lock()
+        self._replicas = [Replica(create_engine(path, **(engine_options or {})))
+                          for path in database_paths]
+        self._turns = itertools.count()
+
+    def __len__(self):
+        return len(self._replicas)
+
+    def pick(self):
+        """Returns the engine of the next healthy replica, or None"""
+        for _ in range(len(self._replicas)):
+            with self._lock:
+                replica = self._replicas[next(self._turns) % len(self._replicas)]
+            if self._healthy(replica):
+                return replica.engine
+        return None
+
+    def _healthy(self, replica):
+        now = time.monotonic()
+        if replica.down_until > now:
+            return False
+        if now - replica.checked_at < HEALTH_CHECK_SECONDS:
+            return True
+
+        try:
+            with replica.engine.connect() as connection:
+                connection.execute('SELECT 1')
+        except Exception as e:
+            print(e)
+            replica.down_until = now + DOWN_SECONDS
+            return False
+        replica.checked_at = now
+        return True
+
+    def dispose(self):
+        for replica in self._replicas:
+            replica.engine.dispose()
+
+
+def replica_engine():
+    """The replica engine for the current request, if it may read from one"""
+    if not has_request_context() or not g.get('db_read_only'):
+        return None
+    if 'db_replica' not in g:
+        replicas = current_app.extensions.get('db_replicas')
+        g.db_replica = replicas.pick() if replicas else None
+    return g.db_replica
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        engine = None if self._flushing else replica_engine()
+        engine = engine or SignallingSession.get_bind(self, mapper, clause)
+        connections = self.info.get('shared_connections')
+        if connections is None:
+            return engine
+        # a Connection bind survives commit() and close(), an engine one is returned to the pool
+        if engine not in connections:
+            connections[engine] = engine.connect()
+        return connections[engine]
+
+
+@contextmanager
+def shared_connections(session):
+    """Keeps one connection per engine checked out for `session` until the
+    block ends, however often it commits or closes in between"""
+    if 'shared_connections' in session.info:
+        yield
+        return
+    session.info['shared_connections'] = {}
+    try:
+        yield
+    finally:
+        session.close()
+        for connection in session.info.pop('shared_connections').values():
+            connection.close()
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
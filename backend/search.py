@@ -0,0 +1,157 @@
+import threading
+
+from sqlalchemy import DDL, event, func
+
+from models import db, Question, on_question_change
+
+"""
+search
+    substring search over questions.question backed by a trigram index.
+
+    On PostgreSQL the pg_trgm GIN index lets `question ILIKE '%term%'` use an
+    index scan, and matches are ranked, counted and paginated in SQL. Other
+    databases (SQLite test runs) fall back to an in-process inverted index of
+    trigram -> question ids that is kept current by Question writes.
+"""
+
+TRIGRAM_INDEX_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_questions_question_trgm "
+    "ON questions USING gin (question gin_trgm_ops)",
+]
+
+for statement in TRIGRAM_INDEX_DDL:
+    event.listen(
+        Question.__table__,
+        'after_create',
+        DDL(statement).execute_if(dialect='postgresql'))
+
+
+def create_search_index(engine):
+    """Adds the trigram index to a database whose tables already exist"""
+    if engine.dialect.name != 'postgresql':
+        return
+    with engine.begin() as connection:
+        for statement in TRIGRAM_INDEX_DDL:
+            connection.execute(statement)
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return '%{}%'.format(escaped)
+
+
+class PostgresSearch:
+
+    def search(self, term, offset, limit):
+        query = Question.rows()
+        if term:
+            query = query.filter(Question.question.ilike(_like_pattern(term), escape='\\'))
+
+        total = query.count()
+        if term:
+            query = query.order_by(func.word_similarity(term, Question.question).desc(), Question.id)
+        else:
+            query = query.order_by(Question.id)
+
+        rows = query.offset(offset).limit(limit).all()
+        return Question.format_rows(rows), total
+
+
+class InvertedIndexSearch:
+    """Trigram inverted index held in memory, for databases without pg_trgm"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._texts = None
+        self._postings = {}
+
+    def search(self, term, offset, limit):
+        needle = (term or '').lower()
+        while True:
+            with self._lock:
+                # checked under the lock: a 'bulk' change may drop the index at any time
+                if self._texts is not None:
+                    matches = self._matches(needle)
+                    break
+            self._load()
+
+        page_ids = matches[offset:offset + limit]
+        rows = {row['id']: row for row in
+                Question.format_rows(Question.rows(Question.id.in_(page_ids)).all())} if page_ids else {}
+        return [rows[question_id] for question_id in page_ids if question_id in rows], len(matches)
+
+    def _matches(self, needle):
+        if len(needle) >= 3:
+            candidates = self._candidates(needle)
+        else:
+            candidates = list(self._texts)
+
+        matches = [question_id for question_id in candidates if needle in self._texts[question_id]]
+        # closest match first: the term covering more of the question ranks higher
+        matches.sort(key=lambda question_id: (len(self._texts[question_id]), question_id))
+        return matches
+
+    def _candidates(self, needle):
+        postings = sorted((self._postings.get(gram, set()) for gram in _trigrams(needle)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        return candidates
+
+    def _load(self):
+        rows = db.session.query(Question.id, Question.question).all()
+        with self._lock:
+            self._texts = {}
+            self._postings = {}
+            for question_id, text in rows:
+                self._add(question_id, text)
+
+    def _add(self, question_id, text):
+        text = (text or '').lower()
+        self._texts[question_id] = text
+        for gram in _trigrams(text):
+            self._postings.setdefault(gram, set()).add(question_id)
+
+    def _remove(self, question_id):
+        text = self._texts.pop(question_id, None)
+        if text is None:
+            return
+        for gram in _trigrams(text):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(question_id)
+
+    def on_change(self, action, question):
+        with self._lock:
+            if self._texts is None:
+                return
+            if question is None:
+                self._texts = None
+                return
+            self._remove(question.id)
+            if action != 'delete':
+                self._add(question.id, question.question)
+
+
+class QuestionSearch:
+
+    def __init__(self):
+        self._postgres = PostgresSearch()
+        self._fallback = InvertedIndexSearch()
+        on_question_change(self._fallback.on_change)
+
+    def search(self, term, offset, limit):
+        """Returns (formatted questions, total matches) for a page of `term` matches"""
+        if db.engine.dialect.name == 'postgresql':
+            return self._postgres.search(term, offset, limit)
+        return self._fallback.search(term, offset, limit)
+
+
+question_search = QuestionSearch()
@@ -0,0 +1,22 @@
+"""Cooperative (gevent) serving mode for the trivia API.
+
+Patches the standard library and psycopg2 so a blocked database call
+yields to other requests instead of holding a worker thread. A single
+process can then keep thousands of requests (quiz players) in flight,
+bounded by the connection pool rather than the number of threads:
+
+    pip install -r requirements-async.txt
+    gunicorn -k gevent --worker-connections 2000 serve_async:app
+
+Each greenlet gets its own SQLAlchemy session, and DB_POOL_SIZE /
+DB_MAX_OVERFLOW cap how many of them talk to PostgreSQL at once.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
+from flaskr import create_app
+
+app = create_app()
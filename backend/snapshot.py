@@ -0,0 +1,292 @@
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from models import db, Question, on_question_change, on_category_change
+
+"""
+snapshot
+    a read-only copy of the questions table in one file that every worker
+    process memory-maps, so list pages and quiz questions are read from
+    shared pages instead of PostgreSQL or a per-worker copy.
+
+    The file is columnar: a header, then int64 arrays (ids in order, their
+    category and difficulty, the offsets of each question and answer in the
+    text blob, the rows ordered by (category, id), and the row range of each
+    category), then the UTF-8 text blob. Arrays are read in place through
+    memoryview casts; only the strings of the rows served are decoded.
+
+    A question or category write in this worker marks the snapshot stale
+    (reads fall back to the database) and wakes a background thread, which
+    rebuilds the file under a file lock and swaps it in with os.replace.
+    Other workers notice the new file within SNAPSHOT_CHECK_SECONDS. Writes
+    made outside the app show up after SNAPSHOT_MAX_AGE seconds.
+
+    Under gevent (serve_async.py) the background thread is a greenlet, so
+    the rebuild never blocks its process: the file lock is polled with
+    LOCK_NB and time.sleep, and the build yields between batches of rows.
+"""
+
+SNAPSHOT_MAGIC = b'TRVSNAP1'
+SNAPSHOT_CHECK_SECONDS = 1
+SNAPSHOT_MAX_AGE = 300
+SNAPSHOT_BUILD_BATCH = 10000
+SNAPSHOT_LOCK_POLL_SECONDS = 0.05
+
+# magic, version, questions, categories, time the rows were read
+HEADER = struct.Struct('<8sqqqd')
+ITEM = 8
+
+
+class CorpusSnapshot:
+    """One mapped snapshot file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(f.fileno())
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+
+        magic, self.version, count, category_count, self.read_at = HEADER.unpack_from(self._map)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError('{} is not a question snapshot'.format(path))
+
+        view = memoryview(self._map)
+        position = HEADER.size
+
+        def column(length):
+            nonlocal position
+            values = view[position:position + length * ITEM].cast('q')
+            position += length * ITEM
+            return values
+
+        self.ids = column(count)
+        self.categories = column(count)
+        self.difficulties = column(count)
+        self.question_offsets = column(count + 1)
+        self.answer_offsets = column(count + 1)
+        self.by_category = column(count)
+        self.category_ids = column(category_count)
+        self.category_starts = column(category_count + 1)
+        self._text = view[position:]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _string(self, offsets, row):
+        return bytes(self._text[offsets[row]:offsets[row + 1]]).decode('utf-8')
+
+    _columns = {
+        'id': lambda snapshot, row: snapshot.ids[row],
+        'question': lambda snapshot, row: snapshot._string(snapshot.question_offsets, row),
+        'answer': lambda snapshot, row: snapshot._string(snapshot.answer_offsets, row),
+        'category': lambda snapshot, row: snapshot.categories[row] or None,
+        'difficulty': lambda snapshot, row: snapshot.difficulties[row],
+    }
+
+    def format_row(self, row, fields=Question.FIELDS):
+        return {field: self._columns[field](self, row) for field in fields}
+
+    def get(self, question_id, fields=Question.FIELDS):
+        row = bisect_left(self.ids, question_id)
+        if row < len(self.ids) and self.ids[row] == question_id:
+            return self.format_row(row, fields)
+        return None
+
+    def _category_range(self, category_id):
+        position = bisect_left(self.category_ids, category_id)
+        if position < len(self.category_ids) and self.category_ids[position] == category_id:
+            return self.category_starts[position], self.category_starts[position + 1]
+        return 0, 0
+
+    def count(self, category_id=None):
+        if category_id is None:
+            return len(self.ids)
+        start, end = self._category_range(category_id)
+        return end - start
+
+    def page(self, category_id=None, offset=0, after_id=None, limit=10, fields=Question.FIELDS):
+        """Formats `limit` questions in id order, optionally of one category,
+        from `offset` or after the id `after_id`"""
+        if category_id is None:
+            start = bisect_right(self.ids, after_id) if after_id is not None else offset
+            rows = range(start, min(start + limit, len(self.ids)))
+        else:
+            low, end = self._category_range(category_id)
+            if after_id is not None:
+                high = end
+                while low < high:
+                    middle = (low + high) // 2
+                    if self.ids[self.by_category[middle]] <= after_id:
+                        low = middle + 1
+                    else:
+                        high = middle
+                start = low
+            else:
+                start = low + offset
+            rows = [self.by_category[position] for position in range(start, min(start + limit, end))]
+        return [self.format_row(row, fields) for row in rows]
+
+
+def write_snapshot(path, rows, version, read_at):
+    """Writes (id, question, answer, category, difficulty) rows, in id order,
+    as a snapshot file next to `path` and moves it into place atomically"""
+    ids, categories, difficulties = array('q'), array('q'), array('q')
+    question_offsets, answer_offsets = array('q', [0]), array('q')
+    questions, answers = [], []
+    size = 0
+    for question_id, question, answer, category, difficulty in rows:
+        if len(ids) % SNAPSHOT_BUILD_BATCH == 0:
+            # lets other greenlets run under gevent; only releases the GIL otherwise
+            time.sleep(0)
+        ids.append(question_id)
+        categories.append(category or 0)
+        difficulties.append(difficulty or 0)
+        question = (question or '').encode('utf-8')
+        questions.append(question)
+        size += len(question)
+        question_offsets.append(size)
+        answers.append((answer or '').encode('utf-8'))
+
+    # answers follow the questions in the text blob
+    answer_offsets.append(size)
+    for answer in answers:
+        size += len(answer)
+        answer_offsets.append(size)
+
+    by_category = array('q', sorted(range(len(ids)), key=lambda row: (categories[row], ids[row])))
+    category_ids, category_starts = array('q'), array('q')
+    for position, row in enumerate(by_category):
+        if not category_ids or category_ids[-1] != categories[row]:
+            category_ids.append(categories[row])
+            category_starts.append(position)
+    category_starts.append(len(by_category))
+
+    temporary = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(SNAPSHOT_MAGIC, version, len(ids), len(category_ids), read_at))
+        for column in (ids, categories, difficulties, question_offsets, answer_offsets,
+                       by_category, category_ids, category_starts):
+            f.write(column.tobytes())
+        for text in questions + answers:
+            f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+class QuestionSnapshot:
+    """Keeps this worker's mapping of the snapshot at `path` current"""
+
+    def __init__(self, app, path, max_age=SNAPSHOT_MAX_AGE):
+        self.app = app
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0
+        self._stale = False
+        self._wanted_at = 0
+        self._wake = threading.Event()
+        self._thread = None
+        on_question_change(self.on_change)
+        on_category_change(self.on_change)
+
+    def current(self):
+        """The mapped snapshot, or None when reads should use the database"""
+        now = time.monotonic()
+        if now - self._checked_at >= SNAPSHOT_CHECK_SECONDS:
+            self._checked_at = now
+            self._refresh()
+        return None if self._stale else self._snapshot
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self.request_rebuild()
+            return
+
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.identity != (stat.st_ino, stat.st_mtime_ns):
+            try:
+                snapshot = CorpusSnapshot(self.path)
+            except (OSError, ValueError) as e:
+                print(e)
+                self.request_rebuild()
+                return
+            # the old mapping is released once no request is reading it
+            self._snapshot = snapshot
+
+        with self._lock:
+            if self._stale and snapshot.read_at >= self._wanted_at:
+                self._stale = False
+
+        if time.time() - snapshot.read_at > self.max_age:
+            self.request_rebuild()
+
+    def on_change(self, action, row):
+        with self._lock:
+            self._wanted_at = time.time()
+            self._stale = True
+        self.request_rebuild()
+
+    def request_rebuild(self):
+        self._wanted_at = time.time()
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='question-snapshot', daemon=True)
+                    self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                self.rebuild()
+            except Exception as e:
+                print(e)
+
+    def rebuild(self):
+        """Rebuilds the file from the database, unless another worker read
+        the rows after this one last asked for a rebuild"""
+        import fcntl
+
+        wanted_at = self._wanted_at
+        with open(self.path + '.lock', 'w') as lock:
+            # one build at a time, so the last file written has every committed write;
+            # polled, as a blocking flock would stall a gevent worker's event loop
+            while True:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    time.sleep(SNAPSHOT_LOCK_POLL_SECONDS)
+            try:
+                version = 0
+                if os.path.exists(self.path):
+                    with open(self.path, 'rb') as f:
+                        header = f.read(HEADER.size)
+                    if len(header) == HEADER.size and header[:8] == SNAPSHOT_MAGIC:
+                        _, version, _, _, read_at = HEADER.unpack(header)
+                        if read_at > wanted_at:
+                            self._checked_at = 0
+                            return False
+
+                read_at = time.time()
+                with self.app.app_context():
+                    rows = db.session.query(Question.id, Question.question, Question.answer,
+                                            Question.category, Question.difficulty) \
+                        .order_by(Question.id).yield_per(SNAPSHOT_BUILD_BATCH)
+                    write_snapshot(self.path, rows, version + 1, read_at)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        self._checked_at = 0
+        return True